@@ -0,0 +1,136 @@
+import os
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import json
+import time
+import queue
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+import torch
+import yaml
+from PIL import Image
+
+from benchmarks.tiny_models import IMAGE_SIZE, save_tiny_components
+from src.model.bundle import MODEL_COMPONENTS, ModelBundle, export_bundle
+from src.model.profiling import peak_memory_mb
+from src.model.registry import ComponentRegistry
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compara la carga del pipeline con from_pretrained y desde un bundle mapeado en memoria: "
+                    "tiempo hasta la primera imagen y pico de RSS"
+    )
+    parser.add_argument("--config", type=str, default=None,
+                        help="Configuración con los modelos reales (sección model); por defecto, modelos diminutos aleatorios")
+    parser.add_argument("--bundle", type=str, default=None,
+                        help="Bundle ya exportado; por defecto se exporta uno temporal desde la configuración")
+    parser.add_argument("--repeats", type=int, default=3, help="Arranques en frío medidos por método")
+    parser.add_argument("--steps", type=int, default=2, help="Pasos de difusión de la primera imagen")
+    parser.add_argument("--size", type=int, default=None, help="Resolución (por defecto 512, o la de los modelos diminutos)")
+    parser.add_argument("--timeout", type=float, default=600, help="Segundos máximos por arranque en frío")
+    parser.add_argument("--output", type=str, default="benchmarks/results/bundle_load.json",
+                        help="Archivo JSON de resultados")
+    return parser.parse_args()
+
+def cold_start(method: str, config: dict, bundle: str, steps: int, size: int, results):
+    """
+    Se ejecuta en un proceso nuevo (con las librerías ya importadas): carga el pipeline y genera una imagen.
+    """
+    start = time.perf_counter()
+    device = torch.device('cpu')
+    if method == 'bundle':
+        pipe = ModelBundle(bundle).load_pipeline(device)
+    else:
+        pipe = ComponentRegistry(config, device, config.get('cache_dir', 'cache')).get('pipeline')
+    pipe.set_progress_bar_config(disable=True)
+    loaded = time.perf_counter()
+    load_rss = peak_memory_mb(device)
+    with torch.no_grad():
+        pipe("one", image=Image.new('RGB', (size, size), 'white'), num_inference_steps=steps, height=size, width=size,
+             generator=torch.Generator().manual_seed(0))
+    results.put({
+        'load_s': loaded - start,
+        'first_image_s': time.perf_counter() - start,
+        'load_peak_rss_mb': load_rss,
+        'peak_rss_mb': peak_memory_mb(device)
+    })
+
+def wait_for_result(process, results, timeout: float) -> dict:
+    """
+    Espera el resultado de un arranque en frío. Si el proceso muere antes de enviarlo (falta de
+    memoria, bundle inexistente, error de importación) o se agota el tiempo, lanza un error en lugar
+    de esperar indefinidamente.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"El proceso de medida terminó sin resultado (código de salida {process.exitcode})")
+            if time.perf_counter() > deadline:
+                process.kill()
+                process.join()
+                raise RuntimeError(f"El proceso de medida no terminó en {timeout:.0f}s")
+
+def measure(method: str, config: dict, bundle: str, args) -> dict:
+    # Cada arranque en un proceso limpio: el pico de RSS es el del proceso desde su inicio
+    context = mp.get_context('spawn')
+    runs = []
+    for _ in range(args.repeats):
+        results = context.Queue()
+        process = context.Process(target=cold_start, args=(method, config, bundle, args.steps, args.size, results))
+        process.start()
+        runs.append(wait_for_result(process, results, args.timeout))
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"El proceso de medida de {method} terminó con código {process.exitcode}")
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+def main():
+    args = parse_arguments()
+    workdir = tempfile.mkdtemp(prefix="kanji_bundle_")
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = yaml.safe_load(f)
+        args.size = args.size or 512
+    else:
+        config = {'model': save_tiny_components(os.path.join(workdir, "models")), 'cache_dir': os.path.join(workdir, "hf_cache")}
+        args.size = args.size or IMAGE_SIZE
+
+    bundle = args.bundle
+    if bundle is None:
+        registry = ComponentRegistry(config, torch.device('cpu'), config.get('cache_dir', 'cache'))
+        bundle = export_bundle(os.path.join(workdir, "bundle.safetensors"), {name: registry.get(name) for name in MODEL_COMPONENTS},
+                               scheduler=registry.get('inference_scheduler'), tokenizer=registry.get('tokenizer'))
+        del registry
+
+    rows = []
+    for method in ('from_pretrained', 'bundle'):
+        row = {'method': method, **measure(method, config, bundle, args)}
+        rows.append(row)
+        logger.info(f"{method}: carga {row['load_s']:.2f}s, primera imagen {row['first_image_s']:.2f}s, "
+                    f"pico de RSS {row['load_peak_rss_mb']:.0f} MB en la carga ({row['peak_rss_mb']:.0f} MB en total)")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'models': args.config or 'tiny',
+            'bundle_mb': os.path.getsize(bundle) / 2**20,
+            'steps': args.steps,
+            'size': args.size,
+            'repeats': args.repeats,
+            'results': rows
+        }, f, indent=2)
+    logger.info(f"Resultados guardados en {args.output}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
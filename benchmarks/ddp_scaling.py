@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import argparse
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+from torch.nn.parallel import DistributedDataParallel
+
+from benchmarks.tiny_models import HIDDEN_SIZE, LATENT_CHANNELS, LATENT_SIZE, MAX_LENGTH, tiny_unet
+from src.model.distributed import barrier, cleanup_distributed, find_free_port, setup_distributed
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Mide la escalabilidad del entrenamiento data-parallel (gloo) en CPU")
+    parser.add_argument("--nproc", type=int, nargs='+', default=[1, 2, 4], help="Números de procesos a medir")
+    parser.add_argument("--threads", type=int, default=1, help="Hilos intra-op por proceso")
+    parser.add_argument("--steps", type=int, default=20, help="Pasos medidos por configuración")
+    parser.add_argument("--warmup", type=int, default=3, help="Pasos de calentamiento no medidos")
+    parser.add_argument("--batch-size", type=int, default=4, help="Lote por proceso")
+    parser.add_argument("--output", type=str, default="benchmarks/results/ddp_scaling.json", help="Archivo JSON de resultados")
+    return parser.parse_args()
+
+def train_steps(rank: int, world_size: int, threads: int, args, results):
+    """
+    Ejecuta en un proceso los mismos pasos que Trainer.train (forward del UNet, MSE contra el ruido,
+    backward con all-reduce de gradientes y AdamW) sobre latentes y embeddings sintéticos.
+    """
+    if world_size > 1:
+        setup_distributed(rank, world_size, 'gloo', threads_per_process=threads)
+    else:
+        torch.set_num_threads(threads)
+    try:
+        torch.manual_seed(rank)
+        unet = tiny_unet()
+        model = DistributedDataParallel(unet) if world_size > 1 else unet
+        optimizer = torch.optim.AdamW(unet.parameters(), lr=1e-4)
+        criterion = nn.MSELoss()
+        latents = torch.randn(args.batch_size, LATENT_CHANNELS, LATENT_SIZE, LATENT_SIZE)
+        encoder_hidden_states = torch.randn(args.batch_size, MAX_LENGTH, HIDDEN_SIZE)
+
+        def step():
+            timesteps = torch.randint(0, 1000, (args.batch_size,))
+            noise = torch.randn_like(latents)
+            loss = criterion(model(latents + noise, timesteps, encoder_hidden_states).sample, noise)
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+
+        for _ in range(args.warmup):
+            step()
+        barrier()
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            step()
+        barrier()
+        elapsed = time.perf_counter() - start
+        if rank == 0:
+            results.put(elapsed)
+    finally:
+        cleanup_distributed()
+
+def measure(nproc: int, threads: int, args) -> float:
+    """
+    Mide las muestras/s globales de `nproc` procesos con `threads` hilos intra-op cada uno.
+
+    Returns:
+        float: Muestras por segundo sumando todos los procesos.
+    """
+    context = mp.get_context('spawn')
+    results = context.SimpleQueue()
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(find_free_port())
+    processes = [context.Process(target=train_steps, args=(rank, nproc, threads, args, results)) for rank in range(nproc)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"Un proceso del benchmark terminó con código {process.exitcode}")
+    elapsed = results.get()
+    return nproc * args.batch_size * args.steps / elapsed
+
+def main():
+    """
+    Compara, para cada número de procesos N, el entrenamiento data-parallel (N procesos x `threads`
+    hilos) con un único proceso que usa los mismos núcleos mediante hilos intra-op (N x `threads`
+    hilos). La eficiencia de escalado es el speedup de N procesos respecto a uno dividido entre N.
+    """
+    args = parse_arguments()
+    cores = os.cpu_count() or 1
+    baseline = measure(1, args.threads, args)
+    rows = []
+    for nproc in args.nproc:
+        if nproc * args.threads > cores:
+            logger.warning(f"{nproc} procesos x {args.threads} hilos superan los {cores} núcleos disponibles")
+        ddp = measure(nproc, args.threads, args) if nproc > 1 else baseline
+        intra_op = measure(1, nproc * args.threads, args) if nproc > 1 else baseline
+        speedup = ddp / baseline
+        rows.append({
+            'nproc': nproc,
+            'threads_per_process': args.threads,
+            'samples_per_s': ddp,
+            'intra_op_samples_per_s': intra_op,
+            'speedup': speedup,
+            'scaling_efficiency': speedup / nproc
+        })
+        logger.info(f"{nproc} procesos: {ddp:.1f} muestras/s (un proceso con {nproc * args.threads} hilos: "
+                    f"{intra_op:.1f}), speedup {speedup:.2f}x, eficiencia {speedup / nproc:.0%}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'cores': cores, 'batch_size': args.batch_size, 'steps': args.steps, 'results': rows}, f, indent=2)
+    logger.info(f"Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
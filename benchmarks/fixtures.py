@@ -0,0 +1,112 @@
+import os
+import random
+from xml.sax.saxutils import escape
+import numpy as np
+
+from src.data_preprocessing.dataset_builder import DatasetBuilder
+from src.data_preprocessing.kanjidic_parser import KanjidicParser
+
+# Los fixtures usan caracteres reales del bloque CJK para que los nombres de archivo y el JSON
+# pasen por las mismas rutas (UTF-8, ensure_ascii=False) que los datos de verdad
+FIRST_CODEPOINT = 0x4E00
+MEANINGS = ["one", "water", "fire", "tree", "gold", "earth", "sun", "moon", "mountain", "river", "person", "hand"]
+
+def literal(index: int) -> str:
+    return chr(FIRST_CODEPOINT + index)
+
+def random_stroke(rng: random.Random) -> str:
+    x1, y1, x2, y2 = (rng.uniform(10, 99) for _ in range(4))
+    cx, cy = rng.uniform(10, 99), rng.uniform(10, 99)
+    return f"M{x1:.2f},{y1:.2f}Q{cx:.2f},{cy:.2f} {x2:.2f},{y2:.2f}"
+
+def write_kanjivg(path: str, num_kanji: int, seed: int = 0):
+    """
+    Escribe un XML con la estructura de KanjiVG (<kanji> con un <g kvg:element> y trazos <path>).
+
+    Args:
+        path (str): Ruta del XML.
+        num_kanji (int): Número de kanji.
+        seed (int, optional): Semilla de los trazos.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<kanjivg xmlns:kvg="http://kanjivg.tagaini.net">\n')
+        for index in range(num_kanji):
+            code = f"{FIRST_CODEPOINT + index:05x}"
+            f.write(f'<kanji id="kvg:kanji_{code}">\n<g id="kvg:{code}" kvg:element="{literal(index)}">\n')
+            for stroke in range(rng.randint(2, 12)):
+                f.write(f'<path id="kvg:{code}-s{stroke + 1}" d="{random_stroke(rng)}"/>\n')
+            f.write('</g>\n</kanji>\n')
+        f.write('</kanjivg>\n')
+
+def write_kanjidic2(path: str, num_characters: int, seed: int = 0):
+    """
+    Escribe un XML con la estructura de KANJIDIC2 (<character> con literal, codepoint, lecturas
+    y significados en varios idiomas).
+
+    Args:
+        path (str): Ruta del XML.
+        num_characters (int): Número de caracteres.
+        seed (int, optional): Semilla de los significados.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<kanjidic2>\n<header><file_version>4</file_version></header>\n')
+        for index in range(num_characters):
+            meanings = rng.sample(MEANINGS, rng.randint(1, 3))
+            f.write(
+                f'<character>\n<literal>{literal(index)}</literal>\n'
+                f'<codepoint><cp_value cp_type="ucs">{FIRST_CODEPOINT + index:x}</cp_value></codepoint>\n'
+                f'<misc><grade>{rng.randint(1, 9)}</grade><stroke_count>{rng.randint(1, 20)}</stroke_count></misc>\n'
+                '<reading_meaning><rmgroup>\n'
+                '<reading r_type="pinyin">yi1</reading>\n<reading r_type="ja_on">イチ</reading>\n'
+                '<reading r_type="ja_kun">ひと.つ</reading>\n'
+                + ''.join(f'<meaning>{escape(meaning)}</meaning>\n' for meaning in meanings)
+                + '<meaning m_lang="fr">un</meaning>\n</rmgroup></reading_meaning>\n</character>\n'
+            )
+        f.write('</kanjidic2>\n')
+
+def write_images(images_dir: str, num_kanji: int, size: int, seed: int = 0):
+    """
+    Escribe imágenes sintéticas en crudo (.npy uint8, fondo blanco con trazos negros), como las que
+    produce SvgToPixelConverter con output_format 'raw'.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(images_dir, exist_ok=True)
+    for index in range(num_kanji):
+        pixels = np.full((size, size), 255, dtype=np.uint8)
+        for _ in range(rng.integers(2, 8)):
+            row, col = rng.integers(0, size - 4, size=2)
+            if rng.random() < 0.5:
+                pixels[row:row + 3, col:] = 0
+            else:
+                pixels[row:, col:col + 3] = 0
+        np.save(os.path.join(images_dir, f"{literal(index)}.npy"), pixels)
+
+def build_dataset(workdir: str, num_kanji: int, size: int = 64) -> tuple:
+    """
+    Construye un dataset sintético completo (definiciones KANJIDIC2, imágenes, JSON del dataset y
+    shard) con los mismos pasos de preprocesado del proyecto.
+
+    Args:
+        workdir (str): Directorio de trabajo.
+        num_kanji (int): Número de muestras.
+        size (int, optional): Resolución de las imágenes.
+
+    Returns:
+        tuple: (ruta del JSON del dataset, ruta del shard).
+    """
+    kanjidic_xml = os.path.join(workdir, "kanjidic2.xml")
+    definitions_file = os.path.join(workdir, "kanjidic2.json")
+    images_dir = os.path.join(workdir, "images")
+    dataset_file = os.path.join(workdir, "dataset", "dataset.json")
+    shard_file = os.path.join(workdir, "dataset", "images.npy")
+
+    write_kanjidic2(kanjidic_xml, num_kanji)
+    KanjidicParser(kanjidic_xml, definitions_file).process()
+    write_images(images_dir, num_kanji, size)
+    DatasetBuilder(definitions_file, images_dir, dataset_file, shard_output_file=shard_file,
+                   expected_size=size, expected_mode='L', num_workers=1).process()
+    return dataset_file, shard_file
@@ -0,0 +1,140 @@
+import os
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import torch
+import yaml
+from PIL import Image
+
+from benchmarks.tiny_models import IMAGE_SIZE, save_tiny_components
+from src.model.inference import InferenceProfile, apply_profile
+from src.model.registry import ComponentRegistry
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+PROMPTS = ["one", "water, river", "fire", "tree, wood", "mountain", "sun, day"]
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compara perfiles de inferencia en CPU: latencia y deriva de píxeles y embeddings frente a fp32"
+    )
+    parser.add_argument("--profiles", nargs='+', default=['fp32', 'bf16', 'int8', 'fp32+channels_last', 'int8+channels_last'],
+                        help="Perfiles a medir (fp32 se mide siempre como referencia)")
+    parser.add_argument("--config", type=str, default=None,
+                        help="Configuración con los modelos reales (sección model); por defecto, modelos diminutos aleatorios")
+    parser.add_argument("--steps", type=int, default=20, help="Pasos de difusión por imagen")
+    parser.add_argument("--size", type=int, default=None, help="Resolución (por defecto 512, o la de los modelos diminutos)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de la primera imagen (cada prompt usa semilla + índice)")
+    parser.add_argument("--warmup", type=int, default=1, help="Imágenes de calentamiento no medidas")
+    parser.add_argument("--output", type=str, default="benchmarks/results/inference_profiles.json",
+                        help="Archivo JSON de resultados")
+    return parser.parse_args()
+
+def load_fresh_pipeline(config: dict):
+    # Cada perfil parte de un pipeline fp32 recién cargado: los perfiles modifican los módulos en el sitio
+    registry = ComponentRegistry(config, torch.device('cpu'), config.get('cache_dir', 'cache'))
+    pipe = registry.get('pipeline')
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+def run_profile(config: dict, profile: InferenceProfile, args) -> dict:
+    """
+    Genera las imágenes de PROMPTS con semillas fijas bajo un perfil.
+
+    Returns:
+        dict: Imágenes (uint8), embeddings de los prompts (float32) y latencias por imagen.
+    """
+    pipe = apply_profile(load_fresh_pipeline(config), profile)
+    control_image = Image.new('RGB', (args.size, args.size), 'white')
+
+    def generate(prompt, seed):
+        generator = torch.Generator().manual_seed(seed)
+        with torch.no_grad():
+            return pipe(prompt, image=control_image, num_inference_steps=args.steps, height=args.size, width=args.size,
+                        generator=generator).images[0]
+
+    for index in range(args.warmup):
+        generate(PROMPTS[index % len(PROMPTS)], args.seed)
+
+    images, latencies = [], []
+    for index, prompt in enumerate(PROMPTS):
+        start = time.perf_counter()
+        image = generate(prompt, args.seed + index)
+        latencies.append(time.perf_counter() - start)
+        images.append(np.asarray(image, dtype=np.uint8))
+
+    with torch.no_grad():
+        embeddings, _ = pipe.encode_prompt(PROMPTS, pipe.device, 1, False)
+    return {'images': images, 'embeddings': embeddings.float(), 'latencies': latencies}
+
+def drift(result: dict, reference: dict) -> dict:
+    """Deriva de un perfil frente a fp32 en las mismas semillas."""
+    pixel_diffs = [np.abs(image.astype(np.int16) - ref.astype(np.int16)) for image, ref in zip(result['images'], reference['images'])]
+    mse = float(np.mean([np.mean(diff.astype(np.float64) ** 2) for diff in pixel_diffs]))
+    embedding_cosine = torch.nn.functional.cosine_similarity(
+        result['embeddings'].flatten(1), reference['embeddings'].flatten(1), dim=1
+    )
+    return {
+        'pixel_mean_abs_diff': float(np.mean([diff.mean() for diff in pixel_diffs])),
+        'pixel_max_abs_diff': int(max(diff.max() for diff in pixel_diffs)),
+        'pixel_psnr_db': float('inf') if mse == 0 else float(10 * np.log10(255 ** 2 / mse)),
+        'embedding_max_abs_diff': float((result['embeddings'] - reference['embeddings']).abs().max()),
+        'embedding_min_cosine': float(embedding_cosine.min())
+    }
+
+def main():
+    args = parse_arguments()
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = yaml.safe_load(f)
+        args.size = args.size or 512
+        workdir = None
+    else:
+        workdir = tempfile.mkdtemp(prefix="kanji_profiles_")
+        config = {'model': save_tiny_components(os.path.join(workdir, "models")), 'cache_dir': os.path.join(workdir, "hf_cache")}
+        args.size = args.size or IMAGE_SIZE
+
+    profiles = [InferenceProfile.parse(name) for name in args.profiles]
+    reference = run_profile(config, InferenceProfile('fp32'), args)
+    reference_latency = float(np.mean(reference['latencies']))
+
+    rows = []
+    for profile in profiles:
+        result = reference if profile.name == 'fp32' else run_profile(config, profile, args)
+        latency = float(np.mean(result['latencies']))
+        row = {
+            'profile': profile.name,
+            'latency_s': latency,
+            'speedup': reference_latency / latency,
+            **drift(result, reference)
+        }
+        rows.append(row)
+        logger.info(f"{profile.name}: {latency:.3f} s/imagen ({row['speedup']:.2f}x), "
+                    f"deriva de píxeles media {row['pixel_mean_abs_diff']:.2f} (máx. {row['pixel_max_abs_diff']}, "
+                    f"PSNR {row['pixel_psnr_db']:.1f} dB), coseno mínimo de embeddings {row['embedding_min_cosine']:.5f}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'models': args.config or 'tiny',
+            'steps': args.steps,
+            'size': args.size,
+            'seed': args.seed,
+            'torch': torch.__version__,
+            'num_threads': torch.get_num_threads(),
+            'results': rows
+        }, f, indent=2)
+    logger.info(f"Resultados guardados en {args.output}")
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
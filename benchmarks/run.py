@@ -0,0 +1,255 @@
+import os
+
+# Todo el benchmark se ejecuta sin red: los modelos diminutos se crean y se cargan desde disco
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader
+
+from benchmarks import fixtures
+from benchmarks.tiny_models import IMAGE_SIZE, save_tiny_components
+from src.data_preprocessing.kanjidic_parser import KanjidicParser
+from src.data_preprocessing.svg_to_pixel import SvgToPixelConverter
+from src.model.data_stream import EpochSampler
+from src.model.generation import generate_batches
+from src.model.registry import ComponentRegistry
+from src.model.training import KanjiDataset, Trainer
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+STAGES = ('svg_to_pixel', 'kanjidic_parser', 'dataloader', 'trainer', 'generation')
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmarks offline en CPU de cada etapa del proyecto")
+    parser.add_argument("--stages", nargs='+', choices=STAGES, default=list(STAGES), help="Etapas a medir")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Archivo JSON de resultados (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--compare", type=str, default=None, help="Resultados de referencia con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Caída relativa de rendimiento a partir de la cual se marca una regresión")
+    parser.add_argument("--workdir", type=str, default=None, help="Directorio de trabajo (por defecto uno temporal)")
+    parser.add_argument("--num-kanji", type=int, default=200, help="Kanji del fixture de KanjiVG")
+    parser.add_argument("--num-characters", type=int, default=5000, help="Caracteres del fixture de KANJIDIC2")
+    parser.add_argument("--num-samples", type=int, default=512, help="Muestras del dataset sintético")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--num-workers", type=int, default=2, help="Workers del DataLoader y del renderizado")
+    parser.add_argument("--batches", type=int, default=50, help="Lotes medidos del DataLoader")
+    parser.add_argument("--steps", type=int, default=10, help="Pasos de entrenamiento medidos")
+    parser.add_argument("--inference-steps", type=int, default=5, help="Pasos de difusión por imagen generada")
+    parser.add_argument("--images", type=int, default=8, help="Imágenes generadas medidas")
+    parser.add_argument("--warmup", type=int, default=2, help="Iteraciones de calentamiento no medidas")
+    return parser.parse_args()
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def bench_svg_to_pixel(workdir: str, args) -> dict:
+    xml_file = os.path.join(workdir, "kanjivg.xml")
+    fixtures.write_kanjivg(xml_file, args.num_kanji)
+    output_file = os.path.join(workdir, "svg", "kanjivg_processed.json")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    converter = SvgToPixelConverter(
+        xml_file, output_file, os.path.join(workdir, "svg_images"), os.path.join(workdir, "svg"),
+        limit=None, num_workers=args.num_workers, output_format='raw'
+    )
+    elapsed = timed(converter.process)
+    with open(output_file, 'r', encoding='utf-8') as f:
+        processed = len(json.load(f))
+    return {'throughput': processed / elapsed, 'unit': 'kanji/s', 'items': processed, 'seconds': elapsed}
+
+def bench_kanjidic_parser(workdir: str, args) -> dict:
+    xml_file = os.path.join(workdir, "kanjidic2_bench.xml")
+    fixtures.write_kanjidic2(xml_file, args.num_characters)
+    parser = KanjidicParser(xml_file, os.path.join(workdir, "kanjidic2_bench.json"))
+    elapsed = timed(parser.process)
+    return {'throughput': args.num_characters / elapsed, 'unit': 'entries/s', 'items': args.num_characters, 'seconds': elapsed}
+
+def bench_dataloader(workdir: str, args, model_config: dict, dataset: tuple) -> dict:
+    dataset_file, shard_file = dataset
+    registry = ComponentRegistry({'model': model_config}, torch.device('cpu'), os.path.join(workdir, "hf_cache"))
+    kanji_dataset = KanjiDataset(
+        dataset_path=dataset_file,
+        tokenizer=registry.get('tokenizer'),
+        shard_path=shard_file,
+        tokens_path=os.path.join(workdir, "dataset", "tokens.npz"),
+        sample_cache_bytes=64 * 2**20
+    )
+    dataloader = DataLoader(
+        kanji_dataset,
+        batch_size=args.batch_size,
+        sampler=EpochSampler(len(kanji_dataset), shuffle=True),
+        num_workers=args.num_workers,
+        collate_fn=kanji_dataset.collate,
+        persistent_workers=args.num_workers > 0
+    )
+    iterator = iter(dataloader)
+    samples = 0
+    start = None
+    for batch_index in range(args.warmup + args.batches):
+        if batch_index == args.warmup:
+            start = time.perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            iterator = iter(dataloader)
+            batch = next(iterator)
+        if batch_index >= args.warmup:
+            samples += len(batch['index'])
+    elapsed = time.perf_counter() - start
+    return {'throughput': samples / elapsed, 'unit': 'samples/s', 'items': samples, 'seconds': elapsed}
+
+def bench_trainer(workdir: str, args, model_config: dict, dataset: tuple) -> dict:
+    dataset_file, shard_file = dataset
+    config = {
+        'cache_dir': os.path.join(workdir, "hf_cache"),
+        'model': model_config,
+        'training': {
+            'batch_size': args.batch_size,
+            'learning_rate': 1e-4,
+            'scheduler_type': 'constant',
+            'warmup_steps': 0,
+            'total_steps': args.warmup,
+            'checkpoint_interval': 10**9,
+            'output_dir': os.path.join(workdir, "checkpoints")
+        },
+        'data': {
+            'image_size': IMAGE_SIZE,
+            'dataset_path': dataset_file,
+            'shard_path': shard_file,
+            'text_embedding_cache': None,
+            'tokens_path': os.path.join(workdir, "dataset", "tokens.npz"),
+            'sample_cache_mb': 64,
+            'num_workers': args.num_workers
+        },
+        'metrics': {'metrics_file': os.path.join(workdir, "metrics.jsonl")}
+    }
+    trainer = Trainer(config)
+    # Los primeros pasos (arranque de workers, asignación de memoria) no se miden
+    trainer.train()
+    trainer.start_step = args.warmup
+    trainer.config['training']['total_steps'] = args.warmup + args.steps
+    elapsed = timed(trainer.train)
+    return {
+        'throughput': args.steps / elapsed,
+        'unit': 'steps/s',
+        'items': args.steps,
+        'seconds': elapsed,
+        'samples_per_s': args.steps * args.batch_size / elapsed
+    }
+
+def bench_generation(workdir: str, args, model_config: dict) -> dict:
+    registry = ComponentRegistry({'model': model_config}, torch.device('cpu'), os.path.join(workdir, "hf_cache"))
+    pipe = registry.get('pipeline')
+    pipe.set_progress_bar_config(disable=True)
+    control_image = Image.new('RGB', (IMAGE_SIZE, IMAGE_SIZE), 'white')
+    prompts = [(str(index), fixtures.MEANINGS[index % len(fixtures.MEANINGS)]) for index in range(args.images)]
+
+    def generate(prompts):
+        for _ in generate_batches(pipe, prompts, args.batch_size, control_image, num_inference_steps=args.inference_steps,
+                                  height=IMAGE_SIZE, width=IMAGE_SIZE, seed=0):
+            pass
+
+    generate(prompts[:args.batch_size] * args.warmup)
+    elapsed = timed(lambda: generate(prompts))
+    return {'throughput': args.images / elapsed, 'unit': 'images/s', 'items': args.images, 'seconds': elapsed,
+            'batch_size': args.batch_size}
+
+def run_stages(workdir: str, args) -> dict:
+    results = {}
+    model_config = None
+    dataset = None
+    for stage in args.stages:
+        logger.info(f"Benchmark: {stage}")
+        if stage in ('dataloader', 'trainer', 'generation') and model_config is None:
+            model_config = save_tiny_components(os.path.join(workdir, "models"))
+        if stage in ('dataloader', 'trainer') and dataset is None:
+            dataset = fixtures.build_dataset(os.path.join(workdir, "fixture_dataset"), args.num_samples)
+
+        if stage == 'svg_to_pixel':
+            results[stage] = bench_svg_to_pixel(workdir, args)
+        elif stage == 'kanjidic_parser':
+            results[stage] = bench_kanjidic_parser(workdir, args)
+        elif stage == 'dataloader':
+            results[stage] = bench_dataloader(workdir, args, model_config, dataset)
+        elif stage == 'trainer':
+            results[stage] = bench_trainer(workdir, args, model_config, dataset)
+        elif stage == 'generation':
+            results[stage] = bench_generation(workdir, args, model_config)
+        logger.info(f"{stage}: {results[stage]['throughput']:.2f} {results[stage]['unit']}")
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara el rendimiento de cada etapa con la referencia.
+
+    Args:
+        results (dict): Resultados actuales (sección `stages`).
+        baseline (dict): Resultados de referencia (sección `stages`).
+        tolerance (float): Caída relativa tolerada.
+
+    Returns:
+        list: Etapas con regresión, como (etapa, rendimiento actual, rendimiento de referencia).
+    """
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        reference = baseline[stage]['throughput']
+        change = result['throughput'] / reference - 1 if reference else 0.0
+        status = "REGRESIÓN" if change < -tolerance else "ok"
+        logger.info(f"{stage}: {result['throughput']:.2f} vs {reference:.2f} {result['unit']} ({change:+.1%}) {status}")
+        if change < -tolerance:
+            regressions.append((stage, result['throughput'], reference))
+    return regressions
+
+def main():
+    args = parse_arguments()
+    torch.manual_seed(0)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="kanji_bench_")
+    try:
+        stages = run_stages(workdir, args)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'num_threads': torch.get_num_threads()
+        },
+        'arguments': {key: value for key, value in vars(args).items() if key not in ('compare', 'output', 'workdir')},
+        'stages': stages
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Resultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(stages, baseline['stages'], args.tolerance)
+        if regressions:
+            logger.error(f"Regresiones de rendimiento en: {', '.join(stage for stage, _, _ in regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
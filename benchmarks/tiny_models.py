@@ -0,0 +1,121 @@
+import os
+import json
+from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+from transformers.models.clip.tokenization_clip import bytes_to_unicode
+from diffusers import AutoencoderKL, ControlNetModel, DDPMScheduler, UNet2DConditionModel
+
+# Dimensiones de los modelos diminutos: suficientes para ejercitar las mismas rutas de código
+# (atención cruzada, bloques down/up) sin pesos preentrenados
+LATENT_CHANNELS = 4
+LATENT_SIZE = 16
+IMAGE_SIZE = 32  # El VAE diminuto reduce x2: IMAGE_SIZE = 2 x LATENT_SIZE
+HIDDEN_SIZE = 32
+MAX_LENGTH = 77
+BLOCK_OUT_CHANNELS = (32, 64)
+DOWN_BLOCK_TYPES = ("CrossAttnDownBlock2D", "DownBlock2D")
+UP_BLOCK_TYPES = ("UpBlock2D", "CrossAttnUpBlock2D")
+
+def tiny_unet() -> UNet2DConditionModel:
+    """
+    Crea un UNet condicional diminuto inicializado aleatoriamente.
+
+    Returns:
+        UNet2DConditionModel: UNet con atención cruzada sobre embeddings de tamaño HIDDEN_SIZE.
+    """
+    return UNet2DConditionModel(
+        sample_size=LATENT_SIZE,
+        in_channels=LATENT_CHANNELS,
+        out_channels=LATENT_CHANNELS,
+        layers_per_block=1,
+        block_out_channels=BLOCK_OUT_CHANNELS,
+        down_block_types=DOWN_BLOCK_TYPES,
+        up_block_types=UP_BLOCK_TYPES,
+        cross_attention_dim=HIDDEN_SIZE,
+        attention_head_dim=8
+    )
+
+def tiny_controlnet() -> ControlNetModel:
+    return ControlNetModel(
+        in_channels=LATENT_CHANNELS,
+        layers_per_block=1,
+        block_out_channels=BLOCK_OUT_CHANNELS,
+        down_block_types=DOWN_BLOCK_TYPES,
+        cross_attention_dim=HIDDEN_SIZE,
+        attention_head_dim=8,
+        conditioning_embedding_out_channels=(16, 32)
+    )
+
+def tiny_vae() -> AutoencoderKL:
+    return AutoencoderKL(
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D",) * len(BLOCK_OUT_CHANNELS),
+        up_block_types=("UpDecoderBlock2D",) * len(BLOCK_OUT_CHANNELS),
+        block_out_channels=BLOCK_OUT_CHANNELS,
+        layers_per_block=1,
+        latent_channels=LATENT_CHANNELS,
+        sample_size=IMAGE_SIZE
+    )
+
+def tiny_tokenizer(save_dir: str) -> CLIPTokenizer:
+    """
+    Crea un tokenizador CLIP byte-level sin merges: cada carácter es un token. El vocabulario
+    cubre todos los bytes, así que cualquier caption se tokeniza sin descargar nada.
+
+    Args:
+        save_dir (str): Directorio donde se escriben vocab.json y merges.txt.
+
+    Returns:
+        CLIPTokenizer: Tokenizador con vocabulario de 2 x 256 + 2 tokens.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    byte_tokens = list(bytes_to_unicode().values())
+    tokens = byte_tokens + [token + "</w>" for token in byte_tokens] + ["<|startoftext|>", "<|endoftext|>"]
+    vocab_file = os.path.join(save_dir, "vocab.json")
+    merges_file = os.path.join(save_dir, "merges.txt")
+    with open(vocab_file, 'w', encoding='utf-8') as f:
+        json.dump({token: index for index, token in enumerate(tokens)}, f, ensure_ascii=False)
+    with open(merges_file, 'w', encoding='utf-8') as f:
+        f.write("#version: 0.2\n")
+    return CLIPTokenizer(vocab_file, merges_file, model_max_length=MAX_LENGTH)
+
+def tiny_text_encoder(tokenizer: CLIPTokenizer) -> CLIPTextModel:
+    return CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=HIDDEN_SIZE,
+        intermediate_size=2 * HIDDEN_SIZE,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=MAX_LENGTH,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    ))
+
+def save_tiny_components(root: str) -> dict:
+    """
+    Guarda en disco todos los componentes diminutos, con la misma estructura que los de Hugging
+    Face, y devuelve la sección `model` de una configuración de entrenamiento que los usa.
+
+    Args:
+        root (str): Directorio raíz de los componentes.
+
+    Returns:
+        dict: Sección `model` para Trainer / ComponentRegistry.
+    """
+    tokenizer = tiny_tokenizer(os.path.join(root, "tokenizer"))
+    tokenizer.save_pretrained(os.path.join(root, "tokenizer"))
+    tiny_text_encoder(tokenizer).save_pretrained(os.path.join(root, "text_encoder"))
+    tiny_unet().save_pretrained(os.path.join(root, "unet"))
+    tiny_vae().save_pretrained(os.path.join(root, "vae"))
+    tiny_controlnet().save_pretrained(os.path.join(root, "controlnet"))
+    DDPMScheduler(num_train_timesteps=1000).save_pretrained(os.path.join(root, "scheduler"))
+    return {
+        'pretrained_model_name_or_path': root,
+        'unet_pretrained': os.path.join(root, "unet"),
+        'controlnet_pretrained': os.path.join(root, "controlnet"),
+        'text_encoder_pretrained': os.path.join(root, "text_encoder"),
+        'tokenizer_pretrained': os.path.join(root, "tokenizer"),
+        'vae_pretrained': os.path.join(root, "vae"),
+        'scheduler_pretrained': root
+    }
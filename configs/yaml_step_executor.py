@@ -1,4 +1,7 @@
+import hashlib
 import importlib
+import json
+import os
 import sys
 from pathlib import Path
 from src.utils.logger import get_logger
@@ -6,9 +9,18 @@ from src.utils.logger import get_logger
 log = get_logger()
 
 class YamlStepExecutor:
-    def __init__(self, config):
+    def __init__(self, config, force=False, from_step=None):
         self.config = config
         self.steps = []
+        self.force = force
+        self.from_step = from_step
+        self.from_step_index = None
+
+        cache_config = self.config.get('cache') or {}
+        self.cache_enabled = cache_config.get('enabled', True)
+        self.hash_contents = cache_config.get('hash_contents', False)
+        self.manifest_path = Path(cache_config.get('manifest', 'data/.step_manifest.json'))
+        self.manifest = self.load_manifest() if self.cache_enabled else {}
 
     def load_steps(self):
         # Add the project root to the Python path
@@ -26,27 +38,176 @@ class YamlStepExecutor:
                 self.steps.append((
                     step_instance,
                     step_config.get('execute', True),
-                    step_config.get('stop', False)
+                    step_config.get('stop', False),
+                    step_config
                 ))
                 log.debug(f"Successfully loaded step: {class_name} from {step_config['module']}")
             except Exception as e:
                 log.error(f"Failed to load step: {step_config['module']}.{step_config['class']}")
                 log.error(f"Error: {str(e)}")
                 raise
-        
+
         log.info(f"Loaded {len(self.steps)} steps successfully.")
 
     def execute(self):
-        for i, (step, execute, stop) in enumerate(self.steps, 1):
+        for i, (step, execute, stop, step_config) in enumerate(self.steps, 1):
             log.info(f"Step {i}: {step.__class__.__name__} (execute={execute})")
             if execute:
-                step.process()
-                log.info(f"Step {step.__class__.__name__} completed successfully.")
+                self.run_step(i, step, step_config)
             else:
                 log.info(f"Skipping step: {step.__class__.__name__}")
-            
+
             if stop:
                 log.info(f"Stopping after step: {step.__class__.__name__} (YAML-stop={stop})")
                 break
         else:
-            log.info("All steps completed without interruption.")
\ No newline at end of file
+            log.info("All steps completed without interruption.")
+
+    def run_step(self, index, step, step_config):
+        key = self.step_key(step_config)
+        if not self.cache_enabled:
+            step.process()
+            log.info(f"Step {step.__class__.__name__} completed successfully.")
+            return
+
+        fingerprint = self.input_fingerprint(step_config)
+        if not self.is_forced(index) and self.is_up_to_date(key, fingerprint, step_config):
+            log.info(f"Step {step.__class__.__name__} is up to date, skipping (use --force to rerun).")
+            return
+
+        # Drop the entry first so an interrupted run is never mistaken for a finished one
+        self.manifest.pop(key, None)
+        self.save_manifest()
+        step.process()
+        log.info(f"Step {step.__class__.__name__} completed successfully.")
+
+        self.manifest[key] = {
+            'inputs': fingerprint,
+            'outputs': self.output_fingerprint(step_config)
+        }
+        self.save_manifest()
+
+    def is_forced(self, index):
+        if self.force:
+            return True
+        if self.from_step is None:
+            return False
+        if self.from_step_index is None:
+            self.from_step_index = self.resolve_from_step()
+        return index >= self.from_step_index
+
+    def resolve_from_step(self):
+        # --from-step accepts a 1-based index, the step name or the step class
+        if str(self.from_step).isdigit():
+            return int(self.from_step)
+        for i, (_, _, _, step_config) in enumerate(self.steps, 1):
+            if self.from_step in (step_config.get('name'), step_config['class']):
+                return i
+        raise ValueError(f"Unknown step for --from-step: {self.from_step}")
+
+    def is_up_to_date(self, key, fingerprint, step_config):
+        entry = self.manifest.get(key)
+        if entry is None or entry['inputs'] != fingerprint:
+            return False
+        outputs = self.output_fingerprint(step_config)
+        # Outputs deleted or touched since the last run invalidate the step as well
+        return all(value is not None for value in outputs.values()) and entry['outputs'] == outputs
+
+    @staticmethod
+    def step_key(step_config):
+        return f"{step_config['module']}.{step_config['class']}:{step_config.get('name', '')}"
+
+    @staticmethod
+    def classify_params(step_config):
+        """
+        Split path-valued params into inputs and outputs. Steps may list them explicitly with
+        `inputs:`/`outputs:`; otherwise *_file(s)/*_dir params named *output* are outputs and
+        the remaining ones are inputs, so flags such as `write_output` or `output_format` are
+        neither. A step run with `write_output: false` writes nothing and has no outputs.
+        """
+        params = step_config.get('params') or {}
+        if 'inputs' in step_config or 'outputs' in step_config:
+            inputs, outputs = step_config.get('inputs', []), step_config.get('outputs', [])
+        else:
+            inputs, outputs = [], []
+            for name, value in params.items():
+                if value is None or not name.endswith(('_file', '_files', '_dir')):
+                    continue
+                if 'output' in name:
+                    outputs.append(name)
+                else:
+                    inputs.append(name)
+        if params.get('write_output') is False:
+            outputs = []
+        return inputs, outputs
+
+    def input_fingerprint(self, step_config):
+        params = step_config.get('params') or {}
+        inputs, _ = self.classify_params(step_config)
+        definition = json.dumps({
+            'module': step_config['module'],
+            'class': step_config['class'],
+            'params': params
+        }, sort_keys=True, default=str)
+        return {
+            'definition': hashlib.sha256(definition.encode('utf-8')).hexdigest(),
+            'files': self.paths_fingerprint(params, inputs)
+        }
+
+    def output_fingerprint(self, step_config):
+        params = step_config.get('params') or {}
+        _, outputs = self.classify_params(step_config)
+        return self.paths_fingerprint(params, outputs)
+
+    def paths_fingerprint(self, params, names):
+        fingerprints = {}
+        for name in names:
+            values = params.get(name)
+            for path in (values if isinstance(values, list) else [values]):
+                if path is not None:
+                    fingerprints[str(path)] = self.path_fingerprint(Path(path))
+        return fingerprints
+
+    def path_fingerprint(self, path):
+        if path.is_file():
+            stat = path.stat()
+            fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            if self.hash_contents:
+                fingerprint['sha256'] = self.file_hash(path)
+            return fingerprint
+        if path.is_dir():
+            # Directories hold thousands of images: summarise them from a single scandir pass
+            count, total_size, latest_mtime = 0, 0, path.stat().st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    count += 1
+                    total_size += stat.st_size
+                    latest_mtime = max(latest_mtime, stat.st_mtime_ns)
+            return {'files': count, 'size': total_size, 'mtime_ns': latest_mtime}
+        return None
+
+    @staticmethod
+    def file_hash(path, chunk_size=1 << 20):
+        digest = hashlib.sha256()
+        with path.open('rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load_manifest(self):
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with self.manifest_path.open('r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"Ignoring unreadable step manifest {self.manifest_path}: {e}")
+            return {}
+
+    def save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
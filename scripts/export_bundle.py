@@ -0,0 +1,65 @@
+import os
+import copy
+import argparse
+import yaml
+import torch
+
+from src.model.bundle import MODEL_COMPONENTS, export_bundle
+from src.model.inference import PRECISIONS
+from src.model.registry import ComponentRegistry
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def load_config(config_path: str) -> dict:
+    """
+    Carga la configuración desde un archivo YAML.
+
+    Args:
+        config_path (str): Ruta al archivo de configuración.
+
+    Returns:
+        dict: Diccionario de configuración.
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"El archivo de configuración no se encontró: {config_path}")
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    return config
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Exporta el UNet entrenado y sus componentes (ControlNet, VAE, CLIP, tokenizador y scheduler) a un único bundle safetensors"
+    )
+    parser.add_argument("--config", type=str, default='configs/train_config.yaml',
+                        help="Ruta al archivo de configuración (sección model)")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="Checkpoint del UNet entrenado (directorio step_N); por defecto, el UNet de la configuración")
+    parser.add_argument("--output", type=str, default='models/kanji_bundle.safetensors',
+                        help="Ruta del bundle")
+    parser.add_argument("--dtype", type=str, default='fp32', choices=list(PRECISIONS),
+                        help="Tipo en el que se guardan los pesos (fp16/bf16 reducen el bundle a la mitad)")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    try:
+        config = copy.deepcopy(load_config(args.config))
+        if args.checkpoint:
+            # Los checkpoints guardan el UNet en formato from_pretrained (config.json + safetensors)
+            config['model']['unet_pretrained'] = args.checkpoint
+        registry = ComponentRegistry(config, torch.device('cpu'), config.get('cache_dir', 'cache'), PRECISIONS[args.dtype])
+        export_bundle(
+            args.output,
+            {name: registry.get(name) for name in MODEL_COMPONENTS},
+            scheduler=registry.get('inference_scheduler'),
+            tokenizer=registry.get('tokenizer')
+        )
+    except Exception as e:
+        logger.error(f"Error al exportar el bundle: {e}")
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 import os
+import time
 import torch
-from transformers import CLIPTokenizer, CLIPTextModel
-from diffusers import StableDiffusionControlNetPipeline, UNet2DConditionModel, AutoencoderKL, DDPMScheduler
+from diffusers import StableDiffusionControlNetPipeline
 from PIL import Image
 import argparse
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 
+from src.model.bundle import ModelBundle
+from src.model.inference import InferenceProfile, apply_profile, default_profile
+from src.model.generation import load_kanji_prompts, load_prompts_file, run_batch_generation
+from src.model.profiling import peak_memory_mb
+from src.model.prompt_cache import PromptEmbeddingCache
+from src.model.registry import ComponentRegistry
+from src.model.server import GenerationClient, serve
 from src.utils.logger import get_logger
 
 logger = get_logger()
@@ -67,36 +75,65 @@ def load_config(config_path: str) -> dict:
 #         logger.error(f"Error al cargar los modelos: {e}")
 #         raise e
 
-def load_pipeline(config: dict, device: torch.device):
+def load_pipeline(config: dict, device: torch.device, profile: InferenceProfile = None, bundle: str = None):
     """
-    Carga el pipeline de Stable Diffusion con ControlNet.
+    Carga el pipeline de Stable Diffusion con ControlNet y le aplica el perfil de inferencia.
+
+    Args:
+        config (dict): Diccionario de configuración.
+        device (torch.device): Dispositivo de inferencia.
+        profile (InferenceProfile, optional): Perfil de inferencia; por defecto `inference.profile`
+            de la configuración o, si no está, fp16 en GPU y fp32 en CPU.
+        bundle (str, optional): Bundle exportado con scripts/export_bundle.py; por defecto
+            `inference.bundle` de la configuración o, si no está, los modelos de la sección `model`.
     """
     try:
-        controlnet = UNet2DConditionModel.from_pretrained(
-            config['model']['controlnet_pretrained'],
-            cache_dir=config.get('cache_dir', 'cache')
-        ).to(device)
-
-        pipe = StableDiffusionControlNetPipeline.from_pretrained(
-            "./pretrained_model/stable-diffusion-v1-5",
-            controlnet=controlnet,
-            safety_checker=None,         # Desactiva el safety_checker
-            torch_dtype=torch.float16
-        ).to(device)
-        logger.info("Pipeline cargado exitosamente sin safety_checker.")
+        inference_config = config.get('inference') or {}
+        if profile is None:
+            profile = InferenceProfile.parse(inference_config.get('profile') or default_profile(device))
+        bundle = bundle or inference_config.get('bundle')
+        start = time.perf_counter()
+
+        if bundle:
+            # Pesos mapeados en memoria desde un único archivo: sin copias intermedias ni consultas a la red
+            pipe = ModelBundle(bundle).load_pipeline(device, profile.torch_dtype)
+            source = bundle
+        else:
+            registry = ComponentRegistry(config, device, config.get('cache_dir', 'cache'), profile.torch_dtype)
+            pipe = registry.get('pipeline')
+            source = "sección model de la configuración"
+        apply_profile(pipe, profile)
+        logger.info(f"Pipeline cargado exitosamente sin safety_checker desde {source} (perfil {profile.name}) "
+                    f"en {time.perf_counter() - start:.1f}s; pico de memoria {peak_memory_mb(device):.0f} MB.")
         return pipe
     except Exception as e:
         logger.error(f"Error al cargar el pipeline: {e}")
         raise e
     
-def generate_image(prompt: str, pipe: StableDiffusionControlNetPipeline, config: dict, device: torch.device) -> Image.Image:
+def load_control_image(path: str = None, size: int = 512) -> Image.Image:
+    """
+    Carga la imagen de control de ControlNet o, si no se indica, un lienzo en blanco.
+
+    Args:
+        path (str, optional): Ruta de la imagen de control.
+        size (int, optional): Tamaño del lienzo en blanco.
+
+    Returns:
+        Image.Image: Imagen de control en RGB.
+    """
+    if path:
+        return Image.open(path).convert('RGB')
+    return Image.new('RGB', (size, size), 'white')
+
+def generate_image(prompt: str, pipe: StableDiffusionControlNetPipeline, config: dict, device: torch.device,
+                   control_image: Image.Image = None) -> Image.Image:
     """
     Genera una imagen a partir de un prompt de texto.
     """
     try:
         logger.info(f"Generando imagen para el prompt: {prompt}")
         with torch.no_grad():
-            image = pipe(prompt).images[0]
+            image = pipe(prompt, image=control_image if control_image is not None else load_control_image()).images[0]
         logger.info("Generación de imagen completada.")
         return image
     except Exception as e:
@@ -111,33 +148,166 @@ def parse_arguments():
         argparse.Namespace: Namespace con los argumentos.
     """
     parser = argparse.ArgumentParser(description="Generar Imágenes Kanji a partir de Prompts de Texto")
-    parser.add_argument("prompt", type=str, help="Prompt de texto para generar la imagen Kanji")
+    parser.add_argument("prompt", type=str, nargs='?', default=None,
+                        help="Prompt de texto para generar la imagen Kanji (modo de una sola imagen)")
     parser.add_argument("--config", type=str, default="configs/train_config.yaml",
                         help="Ruta al archivo de configuración YAML")
     parser.add_argument("--output", type=str, default="generated_image.png",
                         help="Ruta para guardar la imagen generada")
+    parser.add_argument("--control-image", type=str, default=None,
+                        help="Imagen de control de ControlNet (por defecto, un lienzo en blanco)")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Perfil de inferencia: fp32|bf16|fp16 más int8, channels_last, compile unidos por '+' "
+                             "(p. ej. bf16+channels_last); por defecto inference.profile de la configuración")
+    parser.add_argument("--bundle", type=str, default=None,
+                        help="Bundle .safetensors exportado con scripts/export_bundle.py; por defecto inference.bundle "
+                             "de la configuración o, si no está, los modelos de la sección model")
+
+    batch = parser.add_argument_group("modo por lotes")
+    batch.add_argument("--prompts-file", type=str, default=None, help="Archivo con un prompt por línea")
+    batch.add_argument("--kanjidic", type=str, default=None,
+                       help="KANJIDIC2 (JSON o índice SQLite) o JSON del dataset: un prompt por kanji")
+    batch.add_argument("--kanji", type=str, default=None, help="Kanji a generar con --kanjidic (p. ej. 一二三)")
+    batch.add_argument("--limit", type=int, default=None, help="Número máximo de prompts")
+    batch.add_argument("--batch-size", type=int, default=4, help="Prompts por llamada al pipeline")
+    batch.add_argument("--output-dir", type=str, default="generated", help="Directorio de las imágenes generadas")
+    batch.add_argument("--grid", type=str, default=None, help="Ruta de una cuadrícula con todas las imágenes")
+    batch.add_argument("--grid-columns", type=int, default=None, help="Columnas de la cuadrícula")
+    batch.add_argument("--steps", type=int, default=50, help="Pasos de difusión")
+    batch.add_argument("--guidance-scale", type=float, default=7.5, help="Escala de classifier-free guidance")
+    batch.add_argument("--size", type=int, default=512, help="Resolución de salida")
+    batch.add_argument("--seed", type=int, default=None, help="Semilla (cada lote usa semilla + índice)")
+    batch.add_argument("--negative-prompt", type=str, default="", help="Prompt negativo")
+    batch.add_argument("--prompt-cache-size", type=int, default=256,
+                       help="Prompts con embeddings en la caché LRU (0 la desactiva)")
+    batch.add_argument("--writer-threads", type=int, default=2, help="Hilos de escritura de PNG")
+
+    server = parser.add_argument_group("servidor")
+    server.add_argument("--serve", action="store_true",
+                        help="Mantiene el pipeline cargado y atiende peticiones por HTTP con micro-lotes")
+    server.add_argument("--server", type=str, default=None,
+                        help="URL de un servidor en marcha (p. ej. http://127.0.0.1:8765): genera a través de él sin cargar modelos")
+    server.add_argument("--host", type=str, default="127.0.0.1", help="Dirección de escucha del servidor")
+    server.add_argument("--port", type=int, default=8765, help="Puerto del servidor")
+    server.add_argument("--max-batch-size", type=int, default=8, help="Peticiones por micro-lote")
+    server.add_argument("--max-wait-ms", type=float, default=50, help="Espera máxima para completar un micro-lote")
+    server.add_argument("--max-queue", type=int, default=64, help="Peticiones en cola antes de responder 503")
     return parser.parse_args()
 
+def run_client(args, prompts: list):
+    """
+    Genera las imágenes a través de un servidor ya en marcha. En modo por lotes las peticiones se
+    envían en paralelo para que el servidor pueda agruparlas en micro-lotes.
+
+    Args:
+        args (argparse.Namespace): Argumentos de la línea de comandos.
+        prompts (list): Pares (nombre, prompt), o None para el prompt único.
+    """
+    client = GenerationClient(args.server)
+    options = {
+        'negative_prompt': args.negative_prompt,
+        'num_inference_steps': args.steps,
+        'guidance_scale': args.guidance_scale,
+        'size': args.size,
+        'seed': args.seed
+    }
+    if prompts is None:
+        image, metrics = client.generate(args.prompt, **options)
+        image.save(args.output)
+        logger.info(f"Imagen guardada en: {args.output} ({metrics['total_ms']:.0f} ms, "
+                    f"{metrics['queue_ms']:.0f} ms en cola, lote de {metrics['batch_size']})")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def request(item):
+        name, prompt = item
+        image, metrics = client.generate(prompt, **options)
+        image.save(os.path.join(args.output_dir, f"{name}.png"))
+        return metrics
+
+    with ThreadPoolExecutor(max_workers=args.batch_size) as executor:
+        latencies = [metrics['total_ms'] for metrics in executor.map(request, prompts)]
+    logger.info(f"{len(latencies)} imágenes generadas en {args.output_dir}; latencia media {sum(latencies) / len(latencies):.0f} ms")
+
 def main():
     args = parse_arguments()
+    start = time.perf_counter()
     logger.info("Iniciando generación de imagen.")
 
     try:
+        if args.prompts_file:
+            prompts = load_prompts_file(args.prompts_file, limit=args.limit)
+        elif args.kanjidic:
+            prompts = load_kanji_prompts(args.kanjidic, kanji=args.kanji, limit=args.limit)
+        elif args.prompt or args.serve:
+            prompts = None
+        else:
+            raise ValueError("Indica un prompt, --prompts-file o --kanjidic")
+
+        # Con un servidor en marcha no se carga ningún modelo en este proceso
+        if args.server:
+            run_client(args, prompts)
+            return
+
         config = load_config(args.config)
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Usando dispositivo: {device}")
 
-        pipe = load_pipeline(config, device)
+        # El pipeline se carga una sola vez para todas las imágenes
+        pipe = load_pipeline(config, device, InferenceProfile.parse(args.profile) if args.profile else None, args.bundle)
+        # Los prompts repetidos (significados de kanji, el prompt negativo) no vuelven a pasar por CLIP
+        prompt_cache = PromptEmbeddingCache(pipe, max_entries=args.prompt_cache_size) if args.prompt_cache_size > 0 else None
 
-        pil_image = generate_image(
-            prompt=args.prompt,
-            pipe=pipe,
-            config=config,
-            device=device
-        )
+        if args.serve:
+            serve(
+                pipe,
+                load_control_image(args.control_image, args.size),
+                host=args.host,
+                port=args.port,
+                max_batch_size=args.max_batch_size,
+                max_wait_ms=args.max_wait_ms,
+                max_queue=args.max_queue,
+                defaults={'num_inference_steps': args.steps, 'guidance_scale': args.guidance_scale, 'size': args.size},
+                prompt_cache=prompt_cache
+            )
+            return
 
-        pil_image.save(args.output)
-        logger.info(f"Imagen guardada en: {args.output}")
+        if prompts is None:
+            pil_image = generate_image(
+                prompt=args.prompt,
+                pipe=pipe,
+                config=config,
+                device=device,
+                control_image=load_control_image(args.control_image)
+            )
+
+            pil_image.save(args.output)
+            logger.info(f"Imagen guardada en: {args.output} ({time.perf_counter() - start:.1f}s desde el arranque)")
+            return
+
+        logger.info(f"Generando {len(prompts)} imágenes en lotes de {args.batch_size}")
+        stats = run_batch_generation(
+            pipe,
+            prompts,
+            output_dir=args.output_dir,
+            batch_size=args.batch_size,
+            control_image=load_control_image(args.control_image, args.size),
+            grid_path=args.grid,
+            grid_columns=args.grid_columns,
+            writer_threads=args.writer_threads,
+            num_inference_steps=args.steps,
+            guidance_scale=args.guidance_scale,
+            height=args.size,
+            width=args.size,
+            seed=args.seed,
+            negative_prompt=args.negative_prompt,
+            prompt_cache=prompt_cache
+        )
+        logger.info(f"{stats['images']} imágenes generadas en {stats['seconds']:.1f}s "
+                    f"({stats['images_per_s']:.2f} imágenes/s) en {args.output_dir}")
+        if prompt_cache is not None:
+            logger.info(f"Caché de embeddings de prompts: {prompt_cache.stats()}")
 
     except Exception as e:
         logger.error(f"Error durante la generación de la imagen: {e}")
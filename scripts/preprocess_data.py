@@ -1,3 +1,4 @@
+import argparse
 import yaml
 from pathlib import Path
 from configs.yaml_step_executor import YamlStepExecutor
@@ -9,9 +10,18 @@ config_path = 'configs/preprocess_config.yaml'
 with open(config_path, 'r') as config_file:
     config = yaml.safe_load(config_file)
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run the enabled preprocessing steps")
+    parser.add_argument("--force", action="store_true",
+                        help="Rerun every enabled step even if its fingerprint is unchanged")
+    parser.add_argument("--from-step", type=str, default=None,
+                        help="Rerun from this step onwards (1-based index, step name or class)")
+    return parser.parse_args()
+
 def main():
+    args = parse_arguments()
 
-    executor = YamlStepExecutor(config)
+    executor = YamlStepExecutor(config, force=args.force, from_step=args.from_step)
     executor.load_steps()
     try:
         executor.execute()
@@ -20,4 +30,4 @@ def main():
         log.error(f"Execution failed: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
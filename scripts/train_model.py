@@ -1,5 +1,8 @@
 import os
+import argparse
 import yaml
+from src.model.checkpointing import latest_checkpoint
+from src.model.distributed import launch
 from src.model.training import Trainer
 from src.utils.logger import get_logger
 
@@ -22,16 +25,47 @@ def load_config(config_path: str) -> dict:
         config = yaml.safe_load(f)
     return config
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Entrena el modelo de generación de kanji")
+    parser.add_argument("--config", type=str, default='configs/train_config.yaml',
+                        help="Ruta al archivo de configuración")
+    parser.add_argument("--resume", type=str, default=None,
+                        help="Checkpoint (directorio step_N) desde el que reanudar, o 'latest' para el último de output_dir")
+    parser.add_argument("--nproc", type=int, default=1,
+                        help="Procesos locales de entrenamiento data-parallel (backend gloo); 1 para un solo proceso")
+    return parser.parse_args()
+
+def run_training(config: dict, resume: str = None):
+    """
+    Entrena (o reanuda) en el proceso actual. En modo distribuido se ejecuta en cada rank.
+
+    Args:
+        config (dict): Diccionario de configuración.
+        resume (str, optional): Checkpoint desde el que reanudar, o 'latest'.
+    """
+    trainer = Trainer(config)
+    if resume:
+        checkpoint_dir = resume
+        if checkpoint_dir == 'latest':
+            checkpoint_dir = latest_checkpoint(config['training']['output_dir'])
+            if checkpoint_dir is None:
+                raise FileNotFoundError(f"No hay checkpoints en {config['training']['output_dir']}")
+        trainer.resume(checkpoint_dir)
+    trainer.train()
+
 def main():
     """
-    Función principal para iniciar el entrenamiento.
+    Función principal para iniciar (o reanudar) el entrenamiento.
     """
-    config_path = 'configs/train_config.yaml'
+    args = parse_arguments()
 
     try:
-        config = load_config(config_path)
-        trainer = Trainer(config)
-        trainer.train()
+        config = load_config(args.config)
+        # Varios procesos locales (o un lanzamiento con torchrun): un rank por proceso sobre gloo
+        if args.nproc > 1 or 'WORLD_SIZE' in os.environ:
+            launch(run_training, args.nproc, config, args.resume)
+        else:
+            run_training(config, args.resume)
     except Exception as e:
         logger.error(f"Error durante el entrenamiento: {e}")
         exit(1)
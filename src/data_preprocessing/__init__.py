@@ -1,4 +1,5 @@
 from . import decompress_data
+from . import kanjidic_index
 from . import kanjidic_parser
 from . import svg_to_pixel
 from . import dataset_builder
\ No newline at end of file
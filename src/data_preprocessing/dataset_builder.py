@@ -1,27 +1,58 @@
 import json
 import os
+import multiprocessing
+import numpy as np
+from PIL import Image
+from src.data_preprocessing.kanjidic_index import KanjidicIndex
 from src.utils.logger import get_logger
 
 log = get_logger()
 
+# SvgToPixelConverter writes either PNGs or raw uint8 .npy arrays; PNG wins if both exist
+IMAGE_EXTENSIONS = ('.png', '.npy')
+
+def check_image(image_path):
+    """Read an image's header (and verify PNG chunk CRCs) without decoding it. Returns (size, mode, error)."""
+    try:
+        if image_path.endswith('.npy'):
+            pixels = np.load(image_path, mmap_mode='r')
+            if pixels.ndim != 2 or pixels.dtype != np.uint8:
+                return None, None, f"expected a 2-D uint8 array, got {pixels.dtype} {pixels.shape}"
+            return [pixels.shape[1], pixels.shape[0]], 'L', None
+        with Image.open(image_path) as img:
+            size, mode = list(img.size), img.mode
+            img.verify()
+        return size, mode, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
 class DatasetBuilder:
-    def __init__(self, definitions_file, images_dir, output_file):
+    def __init__(self, definitions_file, images_dir, output_file, shard_output_file=None,
+                 verify_images=True, expected_size=None, expected_mode=None, num_workers=None, chunksize=256):
         self.definitions_file = definitions_file
         self.images_dir = images_dir
         self.output_file = output_file
+        self.shard_output_file = shard_output_file
+        self.verify_images = verify_images
+        if isinstance(expected_size, int):
+            expected_size = [expected_size, expected_size]
+        self.expected_size = list(expected_size) if expected_size else None
+        self.expected_mode = expected_mode
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
 
     def process(self):
         try:
-            with open(self.definitions_file, 'r', encoding='utf-8') as f:
-                kanji_data = json.load(f)
+            kanji_data = self.load_definitions()
 
             log.info(f"Loaded {len(kanji_data)} kanji definitions from {self.definitions_file}")
 
+            image_index = self.index_images()
             dataset = []
             missing_images = []
             for kanji, data in kanji_data.items():
-                image_path = os.path.join(self.images_dir, f"{kanji}.png")
-                if os.path.exists(image_path):
+                image_path = image_index.get(kanji)
+                if image_path is not None:
                     dataset.append({
                         "kanji": kanji,
                         "meanings": data["meanings"],
@@ -38,6 +69,12 @@ class DatasetBuilder:
             if missing_images:
                 log.info(f"First 10 missing kanji: {', '.join(missing_images[:10])}")
 
+            if self.verify_images:
+                dataset = self.verify_dataset_images(dataset)
+
+            if self.shard_output_file:
+                self.build_shard(dataset)
+
             os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
             with open(self.output_file, 'w', encoding='utf-8') as f:
                 json.dump(dataset, f, ensure_ascii=False, indent=2)
@@ -47,13 +84,117 @@ class DatasetBuilder:
             log.error(f"Error building dataset: {e}")
             raise
 
+    def load_definitions(self):
+        # Definitions come either from the KANJIDIC2 JSON dump or from its SQLite index
+        if self.definitions_file.endswith(('.sqlite', '.db')):
+            with KanjidicIndex(self.definitions_file) as index:
+                return dict(index.items())
+        with open(self.definitions_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def load_pixels(image_path):
+        if image_path.endswith('.npy'):
+            return np.load(image_path)
+        with Image.open(image_path) as img:
+            return np.asarray(img.convert('L'))
+
+    def build_shard(self, dataset):
+        """
+        Pack every image into one contiguous N x H x W uint8 .npy array and tag each dataset
+        entry with its row (`shard_index`). A sidecar JSON records shape, dtype, the byte offset
+        of the pixel data and the kanji order.
+        """
+        if not dataset:
+            log.warning("No images found, skipping shard creation")
+            return
+
+        height, width = self.load_pixels(dataset[0]["image_path"]).shape
+        os.makedirs(os.path.dirname(self.shard_output_file) or '.', exist_ok=True)
+        tmp_path = f"{self.shard_output_file}.tmp"
+        shard = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(len(dataset), height, width))
+        for index, entry in enumerate(dataset):
+            pixels = self.load_pixels(entry["image_path"])
+            if pixels.shape != (height, width):
+                log.warning(f"Resizing {entry['image_path']} from {pixels.shape} to {(height, width)} for the shard")
+                pixels = np.asarray(Image.fromarray(pixels).resize((width, height), Image.BILINEAR))
+            shard[index] = pixels
+            entry["shard_index"] = index
+        data_offset = shard.offset
+        shard.flush()
+        del shard
+        os.replace(tmp_path, self.shard_output_file)
+
+        with open(self.shard_index_file(self.shard_output_file), 'w', encoding='utf-8') as f:
+            json.dump({
+                "shape": [len(dataset), height, width],
+                "dtype": "uint8",
+                "data_offset": data_offset,
+                "kanji": [entry["kanji"] for entry in dataset]
+            }, f, ensure_ascii=False)
+
+        log.info(f"Packed {len(dataset)} images ({height}x{width}) into {self.shard_output_file}")
+
+    @staticmethod
+    def shard_index_file(shard_file):
+        return f"{os.path.splitext(shard_file)[0]}.index.json"
+
+    def index_images(self):
+        """Map each kanji to its image path with a single directory scan."""
+        index = {}
+        if not os.path.isdir(self.images_dir):
+            log.warning(f"Images directory not found: {self.images_dir}")
+            return index
+        with os.scandir(self.images_dir) as entries:
+            for entry in entries:
+                kanji, extension = os.path.splitext(entry.name)
+                if extension not in IMAGE_EXTENSIONS:
+                    continue
+                current = index.get(kanji)
+                if current is None or IMAGE_EXTENSIONS.index(extension) < IMAGE_EXTENSIONS.index(os.path.splitext(current)[1]):
+                    index[kanji] = os.path.join(self.images_dir, entry.name)
+        return index
+
+    def verify_dataset_images(self, dataset):
+        """
+        Check every image's header in parallel against the expected size and mode, record the
+        result on each entry and drop the ones that would fail at training time.
+        """
+        image_paths = [entry["image_path"] for entry in dataset]
+        if self.num_workers > 1 and len(image_paths) > self.chunksize:
+            with multiprocessing.Pool(self.num_workers) as pool:
+                results = pool.map(check_image, image_paths, chunksize=self.chunksize)
+        else:
+            results = [check_image(path) for path in image_paths]
+
+        verified = []
+        invalid_images = []
+        for entry, (size, mode, error) in zip(dataset, results):
+            if error is None and self.expected_size and size != self.expected_size:
+                error = f"size {size[0]}x{size[1]} != expected {self.expected_size[0]}x{self.expected_size[1]}"
+            if error is None and self.expected_mode and mode != self.expected_mode:
+                error = f"mode {mode} != expected {self.expected_mode}"
+            if error is not None:
+                invalid_images.append((entry["kanji"], error))
+                continue
+            entry["image_size"] = size
+            entry["image_mode"] = mode
+            verified.append(entry)
+
+        log.info(f"Verified {len(verified)} images")
+        if invalid_images:
+            log.warning(f"Excluding {len(invalid_images)} invalid images from the dataset")
+            for kanji, error in invalid_images[:10]:
+                log.warning(f"  {kanji}: {error}")
+        return verified
+
     def verify_data(self):
         log.info(f"Verifying data sources...")
         log.info(f"Definitions file: {os.path.exists(self.definitions_file)}")
         log.info(f"Images directory: {os.path.exists(self.images_dir)}")
         if os.path.exists(self.images_dir):
-            image_count = len([f for f in os.listdir(self.images_dir) if f.endswith('.png')])
-            log.info(f"Number of PNG files in images directory: {image_count}")
+            image_count = len(self.index_images())
+            log.info(f"Number of image files in images directory: {image_count}")
 
 if __name__ == "__main__":
     builder = DatasetBuilder(
@@ -1,30 +1,59 @@
 import gzip
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from src.utils.logger import get_logger
 
 log = get_logger()
 
+def open_compressed(path):
+    """Open a file for binary reading, transparently decompressing .gz inputs as a stream."""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
 class DataDecompressor:
-    def __init__(self, input_files, output_files):
+    def __init__(self, input_files, output_files, chunk_size=1 << 20, max_workers=None, write_output=True):
         self.input_files = [Path(f) for f in input_files]
         self.output_files = [Path(f) for f in output_files]
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or len(self.input_files) or 1
+        self.write_output = write_output
 
     def decompress_file(self, compressed_path, decompressed_path):
+        tmp_path = decompressed_path.with_name(decompressed_path.name + '.tmp')
         try:
+            decompressed_path.parent.mkdir(parents=True, exist_ok=True)
+            # Copy through a bounded buffer so memory use does not depend on the payload size
             with gzip.open(compressed_path, 'rb') as f_in:
-                with open(decompressed_path, 'wb') as f_out:
-                    f_out.write(f_in.read())
+                with open(tmp_path, 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out, self.chunk_size)
+            os.replace(tmp_path, decompressed_path)
             log.info(f"Decompressed {compressed_path} to {decompressed_path}")
+            return True
         except Exception as e:
             log.error(f"Failed to decompress {compressed_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return False
 
     def process(self):
-        for input_file, output_file in zip(self.input_files, self.output_files):
-            self.decompress_file(input_file, output_file)
+        if not self.write_output:
+            for input_file in self.input_files:
+                log.info(f"Not writing a decompressed copy of {input_file}; downstream steps read the .gz stream directly")
+            return
+
+        # zlib releases the GIL while inflating, so threads decompress the files concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.decompress_file, self.input_files, self.output_files))
+
+        failed = [str(f) for f, ok in zip(self.input_files, results) if not ok]
+        if failed:
+            log.error(f"Failed to decompress {len(failed)} file(s): {', '.join(failed)}")
 
 if __name__ == "__main__":
     decompressor = DataDecompressor(
         input_files=["data/raw/kanjidic2/kanjidic2.xml.gz", "data/raw/kanjivg/kanjivg-20220427.xml.gz"],
         output_files=["data/processed/kanjidic2/kanjidic2.xml", "data/processed/kanjivg/kanjivg.xml"]
     )
-    decompressor.process()
\ No newline at end of file
+    decompressor.process()
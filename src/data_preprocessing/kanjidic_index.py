@@ -0,0 +1,80 @@
+import json
+import os
+import sqlite3
+from src.utils.logger import get_logger
+
+log = get_logger()
+
+class KanjidicIndex:
+    """Read-only SQLite store of KANJIDIC2 entries, keyed by literal and by codepoint."""
+
+    FIELDS = ("meanings", "on_readings", "kun_readings")
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.connection = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True, check_same_thread=False)
+
+    @classmethod
+    def write(cls, index_file, entries, batch_size=1000):
+        """Write (literal, data) pairs to a fresh index file, replacing it atomically."""
+        tmp_path = f"{index_file}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
+
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute(
+                "CREATE TABLE kanji (literal TEXT PRIMARY KEY, codepoint INTEGER NOT NULL UNIQUE, "
+                "meanings TEXT NOT NULL, on_readings TEXT NOT NULL, kun_readings TEXT NOT NULL)"
+            )
+            count = 0
+            batch = []
+            for literal, data in entries:
+                batch.append((literal, ord(literal), *(json.dumps(data[field], ensure_ascii=False) for field in cls.FIELDS)))
+                if len(batch) >= batch_size:
+                    connection.executemany("INSERT INTO kanji VALUES (?, ?, ?, ?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            connection.executemany("INSERT INTO kanji VALUES (?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, index_file)
+        log.info(f"Wrote {count} entries to index {index_file}")
+        return count
+
+    def _row_to_data(self, row):
+        return {field: json.loads(value) for field, value in zip(self.FIELDS, row)}
+
+    def get(self, literal):
+        row = self.connection.execute(
+            "SELECT meanings, on_readings, kun_readings FROM kanji WHERE literal = ?", (literal,)
+        ).fetchone()
+        return self._row_to_data(row) if row else None
+
+    def get_by_codepoint(self, codepoint):
+        row = self.connection.execute(
+            "SELECT literal, meanings, on_readings, kun_readings FROM kanji WHERE codepoint = ?", (codepoint,)
+        ).fetchone()
+        return (row[0], self._row_to_data(row[1:])) if row else None
+
+    def items(self):
+        for row in self.connection.execute("SELECT literal, meanings, on_readings, kun_readings FROM kanji ORDER BY rowid"):
+            yield row[0], self._row_to_data(row[1:])
+
+    def __contains__(self, literal):
+        return self.connection.execute("SELECT 1 FROM kanji WHERE literal = ?", (literal,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM kanji").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,48 +1,68 @@
 import xml.etree.ElementTree as ET
 import json
+from src.data_preprocessing.decompress_data import open_compressed
+from src.data_preprocessing.kanjidic_index import KanjidicIndex
 from src.utils.logger import get_logger
 
 log = get_logger()
 
 class KanjidicParser:
-    def __init__(self, input_file, output_file):
+    READING_FIELDS = {'ja_on': 'on_readings', 'ja_kun': 'kun_readings'}
+
+    def __init__(self, input_file, output_file, index_output_file=None):
         self.input_file = input_file
         self.output_file = output_file
+        self.index_output_file = index_output_file
 
     def process(self):
         try:
-            tree = self.parse_xml()
-            kanji_data = self.extract_kanji_data(tree)
-            self.save_kanji_data(kanji_data)
-            log.info(f"KANJIDIC2 data parsed and saved to {self.output_file}")
+            entries = self.iter_characters()
+            count = 0
+            if self.output_file:
+                kanji_data = dict(entries)
+                self.save_kanji_data(kanji_data)
+                entries, count = kanji_data.items(), len(kanji_data)
+            if self.index_output_file:
+                # Without a JSON output the entries stream straight from the parser into the index
+                count = KanjidicIndex.write(self.index_output_file, entries)
+            log.info(f"KANJIDIC2 data parsed ({count} characters) and saved to "
+                     f"{', '.join(p for p in (self.output_file, self.index_output_file) if p)}")
         except Exception as e:
             log.error(f"Error parsing KANJIDIC2 data: {e}")
             raise
 
-    def parse_xml(self):
+    def iter_characters(self):
+        """Stream (literal, data) pairs, keeping only the current <character> in memory."""
         try:
-            tree = ET.parse(self.input_file)
-            return tree.getroot()
+            with open_compressed(self.input_file) as source:
+                context = ET.iterparse(source, events=('start', 'end'))
+                _, root = next(context)
+                for event, element in context:
+                    if event == 'end' and element.tag == 'character':
+                        yield self.extract_character(element)
+                        element.clear()
+                        root.clear()
         except ET.ParseError as e:
             log.error(f"Error parsing XML file: {e}")
             raise
 
     def extract_kanji_data(self, root):
-        kanji_data = {}
-        for character in root.findall('.//character'):
-            kanji = character.find('literal').text
-            kanji_data[kanji] = {
-                "meanings": self.extract_meanings(character),
-                "on_readings": self.extract_readings(character, 'ja_on'),
-                "kun_readings": self.extract_readings(character, 'ja_kun')
-            }
-        return kanji_data
-
-    def extract_meanings(self, character):
-        return [m.text for m in character.findall('.//meaning')]
-
-    def extract_readings(self, character, reading_type):
-        return [r.text for r in character.findall(f".//reading[@r_type='{reading_type}']")]
+        return dict(self.extract_character(character) for character in root.iter('character'))
+
+    def extract_character(self, character):
+        # One traversal collects the literal, meanings and readings together
+        literal = None
+        data = {"meanings": [], "on_readings": [], "kun_readings": []}
+        for element in character.iter():
+            if element.tag == 'literal':
+                literal = element.text
+            elif element.tag == 'meaning':
+                data["meanings"].append(element.text)
+            elif element.tag == 'reading':
+                field = self.READING_FIELDS.get(element.get('r_type'))
+                if field is not None:
+                    data[field].append(element.text)
+        return literal, data
 
     def save_kanji_data(self, kanji_data):
         with open(self.output_file, 'w', encoding='utf-8') as f:
@@ -50,4 +70,4 @@ class KanjidicParser:
 
 if __name__ == "__main__":
     parser = KanjidicParser("data/processed/kanjidic2/kanjidic2.xml", "data/processed/kanjidic2/kanjidic2.json")
-    parser.process()
\ No newline at end of file
+    parser.process()
@@ -1,15 +1,32 @@
 import xml.etree.ElementTree as ET
 import json
-import io
-from PIL import Image
+import os
+import multiprocessing
+from collections import deque
+from itertools import islice
+import numpy as np
 from pathlib import Path
 import cairosvg
+from cairosvg.parser import Tree
+from cairosvg.surface import PNGSurface
+from src.data_preprocessing.decompress_data import open_compressed
 from src.utils.logger import get_logger
 
 log = get_logger()
 
+# Converter instance shared by pool workers, set once per process by the pool initializer
+_worker_converter = None
+
+def _init_render_worker(converter):
+    global _worker_converter
+    _worker_converter = converter
+
+def _render_chunk(jobs):
+    return [_worker_converter.render_kanji(job) for job in jobs]
+
 class SvgToPixelConverter:
-    def __init__(self, input_file, output_file, image_output_dir, svg_output_dir, limit=10, width=128, height=128):
+    def __init__(self, input_file, output_file, image_output_dir, svg_output_dir, limit=10, width=128, height=128,
+                 streaming=True, num_workers=1, chunksize=64, output_format='png'):
         self.input_file = input_file
         self.output_file = output_file
         self.image_output_dir = Path(image_output_dir)
@@ -17,6 +34,13 @@ class SvgToPixelConverter:
         self.limit = limit
         self.width = width
         self.height = height
+        self.streaming = streaming
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        if output_format not in ('png', 'raw'):
+            raise ValueError(f"Unsupported output_format '{output_format}', expected 'png' or 'raw'")
+        self.output_format = output_format
+        self.failures = []
 
     @staticmethod
     def parse_xml(xml_file):
@@ -27,20 +51,47 @@ class SvgToPixelConverter:
             log.error(f"Failed to parse XML file {xml_file}: {e}")
             return None
 
+    def iter_kanji_elements(self):
+        """Yield <kanji> elements one at a time, releasing each one once the caller is done with it."""
+        with open_compressed(self.input_file) as source:
+            context = ET.iterparse(source, events=('start', 'end'))
+            _, root = next(context)
+            for event, element in context:
+                if event != 'end' or element.tag != 'kanji':
+                    continue
+                yield element
+                # Drop the processed subtree so the DOM never grows beyond a single kanji
+                element.clear()
+                root.clear()
+
     def create_image_from_svg(self, svg_content, literal):
-        try:
-            png_data = cairosvg.svg2png(bytestring=svg_content.encode('utf-8'))
-            img = Image.open(io.BytesIO(png_data))
+        if self.output_format == 'raw':
+            img_path = self.image_output_dir / f"{literal}.npy"
+            img_path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(img_path, self.render_pixels(svg_content))
+        else:
+            # cairosvg encodes the PNG once and writes it straight to disk
             img_path = self.image_output_dir / f"{literal}.png"
             img_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(img_path)
-            log.info(f"Successfully processed kanji {literal} and saved to {img_path}")
-            return img_path
-        except Exception as e:
-            log.error(f"Error converting SVG to PNG for kanji {literal}: {e}")
-            return None
+            cairosvg.svg2png(bytestring=svg_content.encode('utf-8'), write_to=str(img_path))
+        log.info(f"Successfully processed kanji {literal} and saved to {img_path}")
+        return img_path
 
-    def process_kanji_element(self, kanji):
+    @staticmethod
+    def render_pixels(svg_content):
+        """Rasterize an SVG into a (height, width) uint8 grayscale array without any PNG encode/decode."""
+        surface = PNGSurface(Tree(bytestring=svg_content.encode('utf-8')), None, 96)
+        surface.cairo.flush()
+        height, width = surface.cairo.get_height(), surface.cairo.get_width()
+        stride = surface.cairo.get_stride()
+        # Cairo ARGB32 is stored as little-endian B, G, R, A
+        bgra = np.ndarray((height, stride // 4, 4), dtype=np.uint8, buffer=surface.cairo.get_data())[:, :width]
+        bgr = bgra[..., :3].astype(np.uint32)
+        gray = (bgr[..., 2] * 299 + bgr[..., 1] * 587 + bgr[..., 0] * 114 + 500) // 1000
+        return gray.astype(np.uint8)
+
+    def prepare_kanji_job(self, kanji):
+        """Build the (id, literal, svg) job for a <kanji> element; runs in the parsing process."""
         kanji_id = kanji.get('id')
         g_element = kanji.find("g")
         literal = g_element.get('{http://kanjivg.tagaini.net}element') if g_element is not None else None
@@ -60,47 +111,155 @@ class SvgToPixelConverter:
             {ET.tostring(g_element, encoding="unicode")}
         </svg>
         '''
+        return kanji_id, literal, svg_content
 
-        svg_path = self.svg_output_dir / f"{literal}.svg"
-        svg_path.parent.mkdir(parents=True, exist_ok=True)
-        with svg_path.open('w', encoding='utf-8') as svg_file:
-            svg_file.write(svg_content)
+    def render_kanji(self, job):
+        """Write the SVG and rasterized image for a job. Returns (record, None) or (None, error)."""
+        kanji_id, literal, svg_content = job
+        try:
+            svg_path = self.svg_output_dir / f"{literal}.svg"
+            svg_path.parent.mkdir(parents=True, exist_ok=True)
+            with svg_path.open('w', encoding='utf-8') as svg_file:
+                svg_file.write(svg_content)
 
-        img_path = self.create_image_from_svg(svg_content, literal)
-        if img_path is None:
-            return None
+            img_path = self.create_image_from_svg(svg_content, literal)
+        except Exception as e:
+            log.error(f"Error rasterizing SVG for kanji {literal}: {e}")
+            return None, f"{type(e).__name__}: {e}"
 
         return {
             'id': kanji_id,
             'image_path': str(img_path),
             'svg_path': str(svg_path)
-        }
+        }, None
 
-    def process(self):
-        root = self.parse_xml(self.input_file)
+    def process_kanji_element(self, kanji):
+        job = self.prepare_kanji_job(kanji)
+        if job is None:
+            return None
+        record, error = self.render_kanji(job)
+        if error is not None:
+            self.record_failure(job, error)
+        return record
+
+    def record_failure(self, job, error):
+        kanji_id, literal, _ = job
+        self.failures.append({'id': kanji_id, 'literal': literal, 'error': error})
+
+    def iter_jobs(self, kanji_elements):
+        for kanji_element in kanji_elements:
+            job = self.prepare_kanji_job(kanji_element)
+            if job is not None:
+                yield job
+
+    def iter_results_serial(self, kanji_elements):
+        for job in self.iter_jobs(kanji_elements):
+            yield job, self.render_kanji(job)
+
+    def iter_results_parallel(self, kanji_elements, limit=None):
+        """
+        Render jobs on a process pool, yielding results in submission order.
+
+        Work is handed out in chunks of `chunksize` and at most two chunks per worker are in
+        flight, so parsing stays lazy and memory stays bounded even in streaming mode. With a
+        `limit`, no more jobs are submitted than successes are still needed, so the pool renders
+        (and writes) the same kanji as the serial path.
+        """
+        jobs = self.iter_jobs(kanji_elements)
+        max_in_flight = self.num_workers * 2
+        succeeded = 0
+        jobs_in_flight = 0
+        with multiprocessing.Pool(self.num_workers, initializer=_init_render_worker, initargs=(self,)) as pool:
+            pending = deque()
+            while True:
+                while len(pending) < max_in_flight:
+                    size = self.chunksize if limit is None else min(self.chunksize, limit - succeeded - jobs_in_flight)
+                    if size <= 0:
+                        break
+                    chunk = list(islice(jobs, size))
+                    if not chunk:
+                        break
+                    pending.append((chunk, pool.apply_async(_render_chunk, (chunk,))))
+                    jobs_in_flight += len(chunk)
+                if not pending:
+                    break
+                chunk, async_result = pending.popleft()
+                jobs_in_flight -= len(chunk)
+                for job, result in zip(chunk, async_result.get()):
+                    if result[1] is None:
+                        succeeded += 1
+                    yield job, result
+
+    def __getstate__(self):
+        # Only the rendering settings travel to pool workers
+        state = self.__dict__.copy()
+        state['failures'] = []
+        return state
+
+    def load_kanji_elements(self):
+        if self.streaming:
+            log.info(f"Streaming kanji elements from {self.input_file}")
+            return self.iter_kanji_elements()
+
+        with open_compressed(self.input_file) as source:
+            root = self.parse_xml(source)
         if root is None:
-            log.error(f"Failed to parse XML file: {self.input_file}")
-            return
+            return None
 
         kanji_elements = root.findall('.//kanji')
         log.info(f"Found {len(kanji_elements)} kanji elements in the XML.")
+        return kanji_elements
+
+    def process(self):
+        try:
+            kanji_elements = self.load_kanji_elements()
+        except (OSError, ET.ParseError) as e:
+            log.error(f"Failed to parse XML file {self.input_file}: {e}")
+            return
+        if kanji_elements is None:
+            log.error(f"Failed to parse XML file: {self.input_file}")
+            return
 
         kanji_images = {}
         processed_count = 0
+        self.failures = []
 
-        for kanji_element in kanji_elements:
-            if self.limit is not None and processed_count >= self.limit:
-                break
-            processed_kanji = self.process_kanji_element(kanji_element)
-            if processed_kanji:
+        if self.num_workers > 1:
+            log.info(f"Rendering with {self.num_workers} worker processes (chunksize={self.chunksize}).")
+            results = self.iter_results_parallel(kanji_elements, limit=self.limit)
+        else:
+            results = self.iter_results_serial(kanji_elements)
+
+        try:
+            for job, (processed_kanji, error) in results:
+                if error is not None:
+                    self.record_failure(job, error)
+                    continue
                 kanji_images[processed_kanji['id']] = processed_kanji
                 processed_count += 1
+                if self.limit is not None and processed_count >= self.limit:
+                    break
+        except (OSError, ET.ParseError) as e:
+            log.error(f"Failed to parse XML file {self.input_file}: {e}")
+            return
+        finally:
+            results.close()
+            if hasattr(kanji_elements, 'close'):
+                kanji_elements.close()
 
         with Path(self.output_file).open('w', encoding='utf-8') as json_file:
             json.dump(kanji_images, json_file, ensure_ascii=False, indent=2)
 
         log.info(f"Successfully processed {processed_count} kanji characters.")
         log.info(f"Saved processed data to: {self.output_file}")
+        self.report_failures()
+
+    def report_failures(self):
+        if not self.failures:
+            return
+        log.warning(f"Failed to render {len(self.failures)} kanji:")
+        for failure in self.failures:
+            log.warning(f"  {failure['literal']} ({failure['id']}): {failure['error']}")
 
 if __name__ == "__main__":
     converter = SvgToPixelConverter(
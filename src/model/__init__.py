@@ -1 +1,15 @@
-from . import training
\ No newline at end of file
+from . import training
+from . import latents
+from . import text_cache
+from . import sample_cache
+from . import transforms
+from . import data_stream
+from . import registry
+from . import profiling
+from . import checkpointing
+from . import distributed
+from . import generation
+from . import server
+from . import prompt_cache
+from . import inference
+from . import bundle
\ No newline at end of file
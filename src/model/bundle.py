@@ -0,0 +1,193 @@
+import os
+import json
+import mmap
+import struct
+import tempfile
+import torch
+import diffusers
+import transformers
+from accelerate import init_empty_weights
+from safetensors.torch import save_file
+from diffusers import StableDiffusionControlNetPipeline
+from transformers import CLIPTokenizer
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+BUNDLE_VERSION = "1"
+MODEL_COMPONENTS = ('unet', 'controlnet', 'vae', 'text_encoder')
+TOKENIZER_FILES = ('vocab.json', 'merges.txt', 'tokenizer_config.json', 'special_tokens_map.json')
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8, 'U8': torch.uint8, 'BOOL': torch.bool
+}
+
+def export_bundle(output_path: str, modules: dict, scheduler, tokenizer, torch_dtype: torch.dtype = None) -> str:
+    """
+    Escribe un único archivo safetensors con los pesos de todos los componentes (prefijados con su
+    nombre, p. ej. `unet.conv_in.weight`) y, en los metadatos de la cabecera, sus configuraciones,
+    la del scheduler y los archivos del tokenizador. Se escribe en un .tmp y se renombra al final.
+
+    Args:
+        output_path (str): Ruta del bundle (.safetensors).
+        modules (dict): Módulos por nombre (unet, controlnet, vae, text_encoder).
+        scheduler: Scheduler de muestreo del pipeline (no el de entrenamiento).
+        tokenizer (CLIPTokenizer): Tokenizador.
+        torch_dtype (torch.dtype, optional): Tipo en el que se guardan los pesos de punto flotante.
+
+    Returns:
+        str: Ruta del bundle.
+    """
+    tensors = {}
+    metadata = {'format': 'pt', 'bundle_version': BUNDLE_VERSION, 'components': json.dumps(list(modules))}
+    for name, module in modules.items():
+        for key, tensor in module.state_dict().items():
+            tensor = tensor.detach().to('cpu')
+            if torch_dtype is not None and tensor.is_floating_point():
+                tensor = tensor.to(torch_dtype)
+            tensors[f"{name}.{key}"] = tensor.contiguous()
+        metadata[f"class.{name}"] = type(module).__name__
+        # Los modelos de diffusers serializan su configuración con _class_name; los de transformers, completa
+        metadata[f"config.{name}"] = module.to_json_string() if hasattr(module, 'to_json_string') else module.config.to_json_string(use_diff=False)
+    metadata['config.scheduler'] = scheduler.to_json_string()
+
+    with tempfile.TemporaryDirectory() as tokenizer_dir:
+        tokenizer.save_pretrained(tokenizer_dir)
+        for filename in TOKENIZER_FILES:
+            path = os.path.join(tokenizer_dir, filename)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    metadata[f"tokenizer.{filename}"] = f.read()
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    save_file(tensors, tmp_path, metadata=metadata)
+    os.replace(tmp_path, output_path)
+    size_mb = os.path.getsize(output_path) / 2**20
+    logger.info(f"Bundle con {len(tensors)} tensores ({size_mb:.0f} MB) de {', '.join(modules)} guardado en {output_path}")
+    return output_path
+
+def read_header(bundle_path: str) -> tuple:
+    """
+    Lee la cabecera de un archivo safetensors sin leer los pesos.
+
+    Returns:
+        tuple: (índice de tensores, metadatos, desplazamiento del inicio de los datos).
+    """
+    with open(bundle_path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    metadata = header.pop('__metadata__', {}) or {}
+    return header, metadata, 8 + header_size
+
+class ModelBundle:
+    def __init__(self, bundle_path: str):
+        """
+        Bundle de modelo mapeado en memoria. Los tensores son vistas (`torch.frombuffer`) de un mmap
+        copy-on-write del archivo: no se leen ni se copian hasta que se tocan, las páginas se
+        comparten con la page cache y con otros procesos que abran el mismo bundle, y no hay ninguna
+        consulta a la red.
+
+        Args:
+            bundle_path (str): Ruta del bundle escrito por export_bundle.
+        """
+        self.bundle_path = bundle_path
+        self.index, self.metadata, self.data_offset = read_header(bundle_path)
+        if self.metadata.get('bundle_version') != BUNDLE_VERSION:
+            raise ValueError(f"{bundle_path} no es un bundle de modelo (versión {self.metadata.get('bundle_version')})")
+        self.components = json.loads(self.metadata['components'])
+        with open(bundle_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    def config(self, name: str) -> dict:
+        return json.loads(self.metadata[f"config.{name}"])
+
+    def state_dict(self, name: str) -> dict:
+        """
+        Devuelve el state_dict de un componente como vistas sobre el archivo mapeado.
+
+        Args:
+            name (str): Nombre del componente.
+
+        Returns:
+            dict: Tensores del componente, sin el prefijo.
+        """
+        prefix = f"{name}."
+        state = {}
+        for key, info in self.index.items():
+            if not key.startswith(prefix):
+                continue
+            dtype = SAFETENSORS_DTYPES[info['dtype']]
+            start, end = info['data_offsets']
+            if end == start:
+                tensor = torch.empty(info['shape'], dtype=dtype)
+            else:
+                tensor = torch.frombuffer(self._mmap, dtype=dtype, count=(end - start) // dtype.itemsize,
+                                          offset=self.data_offset + start).view(info['shape'])
+            state[key[len(prefix):]] = tensor
+        return state
+
+    def load_module(self, name: str, device: torch.device = None, torch_dtype: torch.dtype = None):
+        """
+        Construye un componente sin inicializar sus pesos (dispositivo meta) y le asigna los tensores
+        mapeados, sin copiarlos. Solo se copian si hay que moverlos a otro dispositivo o tipo.
+
+        Args:
+            name (str): Nombre del componente.
+            device (torch.device, optional): Dispositivo destino.
+            torch_dtype (torch.dtype, optional): Tipo destino.
+
+        Returns:
+            torch.nn.Module: Componente en modo eval.
+        """
+        config = self.config(name)
+        class_name = self.metadata[f"class.{name}"]
+        # Los buffers se crean normalmente: los no persistentes (p. ej. position_ids) no están en el bundle
+        with init_empty_weights(include_buffers=False):
+            if hasattr(diffusers, class_name):
+                module = getattr(diffusers, class_name).from_config(config)
+            else:
+                model_class = getattr(transformers, class_name)
+                module = model_class(model_class.config_class.from_dict(config))
+        module.load_state_dict(self.state_dict(name), strict=True, assign=True)
+        if device is not None or torch_dtype is not None:
+            module.to(device=device, dtype=torch_dtype)
+        module.eval()
+        module.requires_grad_(False)
+        return module
+
+    def load_scheduler(self):
+        config = self.config('scheduler')
+        return getattr(diffusers, config['_class_name']).from_config(config)
+
+    def load_tokenizer(self) -> CLIPTokenizer:
+        with tempfile.TemporaryDirectory() as tokenizer_dir:
+            for filename in TOKENIZER_FILES:
+                content = self.metadata.get(f"tokenizer.{filename}")
+                if content is not None:
+                    with open(os.path.join(tokenizer_dir, filename), 'w', encoding='utf-8') as f:
+                        f.write(content)
+            return CLIPTokenizer.from_pretrained(tokenizer_dir)
+
+    def load_pipeline(self, device: torch.device = None, torch_dtype: torch.dtype = None) -> StableDiffusionControlNetPipeline:
+        """
+        Ensambla el pipeline de Stable Diffusion con ControlNet a partir del bundle.
+
+        Args:
+            device (torch.device, optional): Dispositivo de inferencia.
+            torch_dtype (torch.dtype, optional): Tipo de los pesos (por defecto, el del bundle).
+
+        Returns:
+            StableDiffusionControlNetPipeline: Pipeline sin safety_checker.
+        """
+        modules = {name: self.load_module(name, device, torch_dtype) for name in MODEL_COMPONENTS}
+        return StableDiffusionControlNetPipeline(
+            **modules,
+            tokenizer=self.load_tokenizer(),
+            scheduler=self.load_scheduler(),
+            safety_checker=None,
+            feature_extractor=None,
+            requires_safety_checker=False
+        )
@@ -0,0 +1,171 @@
+import os
+import re
+import random
+import shutil
+import threading
+import numpy as np
+import torch
+from safetensors.torch import save_file, load_file
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+CHECKPOINT_PATTERN = re.compile(r"^step_(\d+)$")
+WEIGHTS_NAME = "diffusion_pytorch_model.safetensors"
+CONFIG_NAME = "config.json"
+STATE_NAME = "training_state.pt"
+
+def to_cpu(obj):
+    """
+    Copia recursivamente a CPU los tensores de una estructura (dict, list, tuple), de modo que la
+    copia no cambie aunque el entrenamiento siga modificando los originales.
+
+    Args:
+        obj: Tensor o estructura anidada con tensores.
+
+    Returns:
+        La misma estructura con copias en CPU de los tensores.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True).contiguous()
+    if isinstance(obj, dict):
+        return {key: to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+def rng_state() -> dict:
+    """Devuelve el estado de todos los generadores aleatorios del proceso."""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state: dict):
+    """Restaura el estado de los generadores aleatorios guardado con rng_state()."""
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def find_checkpoints(output_dir: str) -> list:
+    """
+    Lista los checkpoints completos de un directorio, ordenados por paso.
+
+    Args:
+        output_dir (str): Directorio de checkpoints.
+
+    Returns:
+        list: Pares (paso, ruta) de menor a mayor paso.
+    """
+    if not os.path.isdir(output_dir):
+        return []
+    checkpoints = []
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            match = CHECKPOINT_PATTERN.match(entry.name)
+            if match and entry.is_dir() and os.path.exists(os.path.join(entry.path, STATE_NAME)):
+                checkpoints.append((int(match.group(1)), entry.path))
+    return sorted(checkpoints)
+
+def latest_checkpoint(output_dir: str):
+    """Devuelve la ruta del último checkpoint completo, o None si no hay ninguno."""
+    checkpoints = find_checkpoints(output_dir)
+    return checkpoints[-1][1] if checkpoints else None
+
+def load_checkpoint(checkpoint_dir: str, map_location='cpu') -> tuple:
+    """
+    Carga un checkpoint escrito por CheckpointWriter.
+
+    Args:
+        checkpoint_dir (str): Directorio del checkpoint (step_N).
+        map_location: Dispositivo donde cargar los tensores.
+
+    Returns:
+        tuple: (state_dict del UNet, estado de entrenamiento).
+    """
+    weights = load_file(os.path.join(checkpoint_dir, WEIGHTS_NAME), device=str(map_location))
+    state = torch.load(os.path.join(checkpoint_dir, STATE_NAME), map_location=map_location, weights_only=False)
+    return weights, state
+
+class CheckpointWriter:
+    def __init__(self, output_dir: str, keep_last: int = 3):
+        """
+        Escritor de checkpoints en segundo plano. El bucle de entrenamiento solo paga la copia a CPU
+        del estado; la serialización y la escritura a disco ocurren en un hilo aparte. Como mucho hay
+        una escritura en curso: un nuevo checkpoint espera a que termine la anterior, lo que acota la
+        memoria usada por las copias.
+
+        Cada checkpoint es un directorio `step_N` con los pesos del UNet en safetensors y su
+        config.json (cargable con `UNet2DConditionModel.from_pretrained`) más `training_state.pt`
+        con el optimizador, el scheduler de LR, los generadores aleatorios y la posición del flujo
+        de datos. Se escribe en `step_N.tmp` y se renombra al terminar, de modo que un checkpoint
+        interrumpido nunca se confunde con uno completo.
+
+        Args:
+            output_dir (str): Directorio de checkpoints.
+            keep_last (int, optional): Número de checkpoints que se conservan; 0/None los conserva todos.
+        """
+        self.output_dir = output_dir
+        self.keep_last = keep_last
+        self._thread = None
+        self._error = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def save(self, step: int, unet_state: dict, unet_config: str, training_state: dict):
+        """
+        Encola la escritura de un checkpoint ya copiado a CPU.
+
+        Args:
+            step (int): Paso del checkpoint.
+            unet_state (dict): state_dict del UNet en CPU.
+            unet_config (str): Configuración del UNet en JSON.
+            training_state (dict): Estado de entrenamiento en CPU.
+        """
+        self.wait()
+        self._thread = threading.Thread(
+            target=self._write, args=(step, unet_state, unet_config, training_state),
+            name=f"checkpoint-step-{step}", daemon=False
+        )
+        self._thread.start()
+
+    def wait(self):
+        """Espera a la escritura en curso y propaga su error, si lo hubo."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Error al escribir el checkpoint: {error}") from error
+
+    def _write(self, step: int, unet_state: dict, unet_config: str, training_state: dict):
+        final_dir = os.path.join(self.output_dir, f"step_{step}")
+        tmp_dir = f"{final_dir}.tmp"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            save_file(unet_state, os.path.join(tmp_dir, WEIGHTS_NAME))
+            with open(os.path.join(tmp_dir, CONFIG_NAME), 'w', encoding='utf-8') as f:
+                f.write(unet_config)
+            torch.save(training_state, os.path.join(tmp_dir, STATE_NAME))
+            shutil.rmtree(final_dir, ignore_errors=True)
+            os.replace(tmp_dir, final_dir)
+            logger.info(f"Checkpoint guardado en el paso {step} en {final_dir}")
+            self.apply_retention()
+        except Exception as e:
+            self._error = e
+            logger.error(f"Error al escribir el checkpoint del paso {step}: {e}")
+
+    def apply_retention(self):
+        """Borra los checkpoints más antiguos, conservando los `keep_last` últimos."""
+        if not self.keep_last:
+            return
+        for _, path in find_checkpoints(self.output_dir)[:-self.keep_last]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Checkpoint antiguo eliminado: {path}")
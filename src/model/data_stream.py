@@ -0,0 +1,107 @@
+import torch
+from torch.utils.data import Sampler
+
+class EpochSampler(Sampler):
+    def __init__(self, num_samples: int, shuffle: bool = True, seed: int = 0, num_replicas: int = 1, rank: int = 0):
+        """
+        Sampler con una permutación determinista por época (semilla + época), de modo que el orden
+        de cada época es reproducible y puede retomarse a mitad de época. Con varios procesos, cada
+        rank recorre una parte disjunta de la misma permutación (como DistributedSampler), rellenando
+        con las primeras muestras para que todos los ranks tengan el mismo número de lotes.
+
+        Args:
+            num_samples (int): Tamaño del dataset.
+            shuffle (bool, optional): Si se baraja en cada época.
+            seed (int, optional): Semilla base.
+            num_replicas (int, optional): Número de procesos de entrenamiento.
+            rank (int, optional): Rank de este proceso.
+        """
+        self.num_samples = num_samples
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.samples_per_replica = -(-num_samples // num_replicas)
+        self.epoch = 0
+        self.start_index = 0
+
+    def set_epoch(self, epoch: int, start_index: int = 0):
+        """
+        Fija la época (y opcionalmente la posición dentro de ella) de la próxima iteración.
+
+        Args:
+            epoch (int): Época.
+            start_index (int, optional): Número de muestras de la época que se saltan.
+        """
+        self.epoch = epoch
+        self.start_index = start_index
+
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            indices = torch.randperm(self.num_samples, generator=generator).tolist()
+        else:
+            indices = list(range(self.num_samples))
+        if self.num_replicas > 1:
+            total_size = self.samples_per_replica * self.num_replicas
+            indices = (indices * -(-total_size // len(indices)))[:total_size]
+            indices = indices[self.rank:total_size:self.num_replicas]
+        start, self.start_index = self.start_index, 0
+        return iter(indices[start:])
+
+    def __len__(self):
+        return self.samples_per_replica - self.start_index
+
+class InfiniteBatchStream:
+    def __init__(self, dataloader, sampler):
+        """
+        Flujo infinito de lotes sobre un DataLoader de larga vida. Al agotarse una época pasa a la
+        siguiente (con su propia permutación) reutilizando los workers persistentes, en lugar de
+        crear un iterador nuevo en cada paso.
+
+        Args:
+            dataloader (torch.utils.data.DataLoader): DataLoader, idealmente con persistent_workers.
+            sampler: Sampler del DataLoader con `set_epoch(epoch)`.
+        """
+        self.dataloader = dataloader
+        self.sampler = sampler
+        self.epoch = 0
+        self.batches_in_epoch = 0
+        self._iterator = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self.dataloader)
+        try:
+            batch = next(self._iterator)
+        except StopIteration:
+            self.epoch += 1
+            self.batches_in_epoch = 0
+            self.sampler.set_epoch(self.epoch)
+            self._iterator = iter(self.dataloader)
+            try:
+                batch = next(self._iterator)
+            except StopIteration:
+                raise RuntimeError("El DataLoader no produce ningún lote: ¿dataset vacío?")
+        self.batches_in_epoch += 1
+        return batch
+
+    def state_dict(self) -> dict:
+        return {'epoch': self.epoch, 'batches_in_epoch': self.batches_in_epoch}
+
+    def load_state_dict(self, state: dict):
+        """
+        Retoma el flujo en la época y el lote guardados, saltando las muestras ya vistas en el
+        sampler en lugar de cargarlas.
+
+        Args:
+            state (dict): Estado devuelto por state_dict().
+        """
+        self.epoch = state['epoch']
+        self.batches_in_epoch = state['batches_in_epoch']
+        self.sampler.set_epoch(self.epoch, self.batches_in_epoch * self.dataloader.batch_size)
+        self._iterator = None
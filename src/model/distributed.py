@@ -0,0 +1,107 @@
+import os
+import socket
+import logging
+from contextlib import contextmanager
+import torch
+import torch.distributed as dist
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+@contextmanager
+def main_process_first():
+    """
+    Ejecuta el bloque primero en el proceso 0 y después en el resto, para que los archivos que el
+    bloque construye (cachés, tablas de tokens) se escriban una sola vez y los demás los reutilicen.
+    """
+    if not is_main_process():
+        barrier()
+    yield
+    if is_main_process():
+        barrier()
+
+def find_free_port(host: str = '127.0.0.1') -> int:
+    """Devuelve un puerto libre de `host` (lo elige el sistema al enlazar el puerto 0)."""
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+def setup_distributed(rank: int, world_size: int, backend: str = 'gloo', threads_per_process: int = None):
+    """
+    Inicializa el grupo de procesos de este rank. Los ranks distintos de 0 solo registran errores,
+    y cada proceso limita sus hilos intra-op para no competir con los demás por los núcleos.
+
+    Args:
+        rank (int): Rank de este proceso.
+        world_size (int): Número total de procesos.
+        backend (str, optional): Backend de torch.distributed.
+        threads_per_process (int, optional): Hilos intra-op por proceso; por defecto núcleos / procesos.
+    """
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    if 'MASTER_PORT' not in os.environ:
+        # Con varios procesos todos deben conocer el mismo puerto: lo fija quien los lanza (launch, torchrun)
+        if world_size > 1:
+            raise RuntimeError("MASTER_PORT no está definido: lanza los procesos con launch() o torchrun")
+        os.environ['MASTER_PORT'] = str(find_free_port(os.environ['MASTER_ADDR']))
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    torch.set_num_threads(threads_per_process or max(1, (os.cpu_count() or 1) // world_size))
+    if rank != 0:
+        logging.disable(logging.WARNING)
+    logger.info(f"Proceso {rank}/{world_size} inicializado con backend {backend} "
+                f"y {torch.get_num_threads()} hilos intra-op por proceso")
+
+def cleanup_distributed():
+    if is_distributed():
+        dist.destroy_process_group()
+
+def launch(fn, nproc: int, *args, backend: str = 'gloo'):
+    """
+    Lanza `nproc` procesos locales que ejecutan `fn(*args)` dentro de un grupo de procesos ya
+    inicializado. Si el proceso ya fue lanzado por torchrun (WORLD_SIZE en el entorno), usa ese
+    grupo en lugar de lanzar otros.
+
+    Args:
+        fn (callable): Función a ejecutar en cada proceso. Debe poder serializarse (nivel de módulo).
+        nproc (int): Número de procesos locales.
+        *args: Argumentos de `fn`.
+        backend (str, optional): Backend de torch.distributed.
+    """
+    if 'WORLD_SIZE' in os.environ and 'RANK' in os.environ:
+        _run(int(os.environ['RANK']), int(os.environ['WORLD_SIZE']), backend, fn, args)
+    else:
+        # Un puerto libre por ejecución: dos entrenamientos locales a la vez no chocan en un puerto fijo
+        os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+        os.environ.setdefault('MASTER_PORT', str(find_free_port(os.environ['MASTER_ADDR'])))
+        torch.multiprocessing.spawn(_run, args=(nproc, backend, fn, args), nprocs=nproc, join=True)
+
+def _run(rank: int, world_size: int, backend: str, fn, args):
+    setup_distributed(rank, world_size, backend)
+    try:
+        fn(*args)
+    finally:
+        cleanup_distributed()
+
+def all_gather_object(obj) -> list:
+    """Reúne un objeto serializable de cada rank; sin grupo de procesos devuelve `[obj]`."""
+    if not is_distributed():
+        return [obj]
+    gathered = [None] * get_world_size()
+    dist.all_gather_object(gathered, obj)
+    return gathered
@@ -0,0 +1,223 @@
+import os
+import json
+import queue
+import threading
+import time
+import torch
+from PIL import Image
+
+from src.data_preprocessing.kanjidic_index import KanjidicIndex
+from src.model.training import caption_for
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def load_prompts_file(prompts_file: str, limit: int = None) -> list:
+    """
+    Lee un prompt por línea (se ignoran las líneas vacías y las que empiezan por #).
+
+    Args:
+        prompts_file (str): Ruta del archivo de prompts.
+        limit (int, optional): Número máximo de prompts.
+
+    Returns:
+        list: Pares (nombre, prompt); el nombre es el número de línea.
+    """
+    prompts = []
+    with open(prompts_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            prompt = line.strip()
+            if prompt and not prompt.startswith('#'):
+                prompts.append((f"{line_number:05d}", prompt))
+    return prompts[:limit]
+
+def load_kanji_prompts(definitions_file: str, kanji: str = None, limit: int = None) -> list:
+    """
+    Construye los prompts de una lista de kanji a partir de KANJIDIC2 (JSON de KanjidicParser o su
+    índice SQLite) o del JSON del dataset, con el mismo caption que se usa en el entrenamiento.
+
+    Args:
+        definitions_file (str): JSON/SQLite de KANJIDIC2 o JSON del dataset.
+        kanji (str, optional): Kanji a generar (p. ej. "一二三"); por defecto todos.
+        limit (int, optional): Número máximo de prompts.
+
+    Returns:
+        list: Pares (kanji, prompt).
+    """
+    if definitions_file.endswith(('.sqlite', '.db')):
+        with KanjidicIndex(definitions_file) as index:
+            entries = dict(index.items())
+    else:
+        with open(definitions_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if isinstance(entries, list):
+            entries = {item['kanji']: item for item in entries}
+
+    literals = list(kanji) if kanji else list(entries)
+    prompts = []
+    for literal in literals:
+        if literal not in entries:
+            logger.warning(f"Kanji sin definición en {definitions_file}: {literal}")
+            continue
+        prompts.append((literal, caption_for(entries[literal])))
+    return prompts[:limit]
+
+def batched(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def make_grid(images: list, columns: int) -> Image.Image:
+    """
+    Compone las imágenes (todas del mismo tamaño) en una cuadrícula, fila a fila.
+
+    Args:
+        images (list): Imágenes PIL.
+        columns (int): Número de columnas.
+
+    Returns:
+        Image.Image: Cuadrícula.
+    """
+    width, height = images[0].size
+    rows = -(-len(images) // columns)
+    grid = Image.new('RGB', (columns * width, rows * height), 'white')
+    for index, image in enumerate(images):
+        grid.paste(image, ((index % columns) * width, (index // columns) * height))
+    return grid
+
+class ImageWriter:
+    def __init__(self, num_threads: int = 2, max_pending: int = 64):
+        """
+        Escritor de imágenes en segundo plano: la codificación PNG y la escritura a disco se solapan
+        con la difusión del siguiente lote. La cola es acotada, de modo que si el disco no da abasto
+        la generación espera en lugar de acumular imágenes en memoria.
+
+        Args:
+            num_threads (int, optional): Hilos de escritura.
+            max_pending (int, optional): Imágenes pendientes como máximo.
+        """
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.errors = []
+        self.written = 0
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, name=f"image-writer-{index}", daemon=True)
+                        for index in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, image: Image.Image, path: str):
+        self.queue.put((image, path))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            image, path = item
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                image.save(path)
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                logger.error(f"Error al guardar la imagen {path}: {e}")
+                with self._lock:
+                    self.errors.append((path, e))
+
+    def close(self):
+        """Espera a que se escriban todas las imágenes pendientes y detiene los hilos."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+def generate_batches(pipe, prompts: list, batch_size: int, control_image: Image.Image, num_inference_steps: int = 50,
+                     guidance_scale: float = 7.5, height: int = None, width: int = None, seed: int = None,
+                     negative_prompt: str = "", prompt_cache=None):
+    """
+    Genera las imágenes de los prompts por lotes con un único pipeline ya cargado.
+
+    Args:
+        pipe (StableDiffusionControlNetPipeline): Pipeline cargado.
+        prompts (list): Pares (nombre, prompt).
+        batch_size (int): Prompts por llamada al pipeline.
+        control_image (Image.Image): Imagen de control de ControlNet, común a todo el lote.
+        num_inference_steps (int, optional): Pasos de difusión.
+        guidance_scale (float, optional): Escala de classifier-free guidance.
+        height (int, optional): Alto de salida.
+        width (int, optional): Ancho de salida.
+        seed (int, optional): Semilla; cada lote usa `seed + índice del lote`.
+        negative_prompt (str, optional): Prompt negativo común a todas las imágenes.
+        prompt_cache (PromptEmbeddingCache, optional): Caché de embeddings; con ella los prompts
+            repetidos no vuelven a pasar por el text encoder.
+
+    Yields:
+        tuple: (nombres, imágenes PIL) de cada lote.
+    """
+    for batch_index, batch in enumerate(batched(prompts, batch_size)):
+        names = [name for name, _ in batch]
+        generator = None
+        if seed is not None:
+            generator = torch.Generator(device=pipe.device).manual_seed(seed + batch_index)
+        texts = [prompt for _, prompt in batch]
+        if prompt_cache is not None:
+            prompt_kwargs = prompt_cache.pipe_kwargs(texts, [negative_prompt] * len(texts))
+        else:
+            prompt_kwargs = {'prompt': texts, 'negative_prompt': [negative_prompt] * len(texts)}
+        with torch.no_grad():
+            images = pipe(
+                **prompt_kwargs,
+                image=control_image,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                height=height,
+                width=width,
+                generator=generator
+            ).images
+        yield names, images
+
+def run_batch_generation(pipe, prompts: list, output_dir: str, batch_size: int, control_image: Image.Image,
+                         grid_path: str = None, grid_columns: int = None, writer_threads: int = 2, **pipe_kwargs) -> dict:
+    """
+    Genera todas las imágenes, las escribe en segundo plano en `output_dir/<nombre>.png` y, si se
+    pide, compone una cuadrícula.
+
+    Args:
+        pipe (StableDiffusionControlNetPipeline): Pipeline cargado.
+        prompts (list): Pares (nombre, prompt).
+        output_dir (str): Directorio de salida.
+        batch_size (int): Prompts por lote.
+        control_image (Image.Image): Imagen de control.
+        grid_path (str, optional): Ruta de la cuadrícula; None para no componerla.
+        grid_columns (int, optional): Columnas de la cuadrícula (por defecto, la raíz del total).
+        writer_threads (int, optional): Hilos de escritura de PNG.
+        **pipe_kwargs: Argumentos de generate_batches (pasos, guidance, tamaño, semilla, prompt
+            negativo, caché de embeddings).
+
+    Returns:
+        dict: Imágenes generadas, segundos e imágenes/s.
+    """
+    writer = ImageWriter(num_threads=writer_threads)
+    grid_images = []
+    generated = 0
+    start = time.perf_counter()
+    try:
+        for names, images in generate_batches(pipe, prompts, batch_size, control_image, **pipe_kwargs):
+            for name, image in zip(names, images):
+                writer.submit(image, os.path.join(output_dir, f"{name}.png"))
+            if grid_path:
+                grid_images.extend(images)
+            generated += len(images)
+            elapsed = time.perf_counter() - start
+            logger.info(f"{generated}/{len(prompts)} imágenes - {generated / elapsed:.2f} imágenes/s")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    if grid_path and grid_images:
+        columns = grid_columns or max(1, round(len(grid_images) ** 0.5))
+        make_grid(grid_images, columns).save(grid_path)
+        logger.info(f"Cuadrícula de {len(grid_images)} imágenes guardada en {grid_path}")
+    if writer.errors:
+        raise RuntimeError(f"No se pudieron guardar {len(writer.errors)} imágenes")
+
+    return {'images': generated, 'seconds': elapsed, 'images_per_s': generated / elapsed if elapsed else 0.0}
@@ -0,0 +1,105 @@
+import torch
+from torch import nn
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+PRECISIONS = {'fp32': torch.float32, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+OPTIONS = ('int8', 'channels_last', 'compile')
+
+class InferenceProfile:
+    def __init__(self, precision: str = 'fp32', int8: bool = False, channels_last: bool = False, compile: bool = False):
+        """
+        Perfil de inferencia: precisión de los pesos más optimizaciones opcionales. Se escribe como
+        una lista de opciones unidas por '+', p. ej. "fp32", "bf16+channels_last" o "int8+compile".
+
+        - precision: fp32 (referencia), bf16 (CPU con AVX512-BF16/AMX) o fp16 (solo GPU).
+        - int8: cuantización dinámica a int8 de las capas Linear del UNet y del text encoder
+          (pesos int8, activaciones cuantizadas al vuelo); requiere fp32.
+        - channels_last: formato de memoria NHWC para las convoluciones del UNet, ControlNet y VAE.
+        - compile: torch.compile del UNet.
+
+        Args:
+            precision (str, optional): 'fp32', 'bf16' o 'fp16'.
+            int8 (bool, optional): Cuantización dinámica int8.
+            channels_last (bool, optional): Formato channels_last.
+            compile (bool, optional): torch.compile del UNet.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisión no soportada: {precision} (usa {', '.join(PRECISIONS)})")
+        if int8 and precision != 'fp32':
+            raise ValueError("La cuantización dinámica int8 parte de pesos fp32: no se combina con bf16/fp16")
+        self.precision = precision
+        self.int8 = int8
+        self.channels_last = channels_last
+        self.compile = compile
+
+    @classmethod
+    def parse(cls, name: str) -> 'InferenceProfile':
+        """
+        Crea un perfil a partir de su nombre ("bf16+channels_last", "int8", ...). Sin precisión
+        explícita se usa fp32.
+        """
+        precision = 'fp32'
+        options = set()
+        for token in filter(None, (token.strip() for token in name.split('+'))):
+            if token in PRECISIONS:
+                precision = token
+            elif token in OPTIONS:
+                options.add(token)
+            else:
+                raise ValueError(f"Opción de perfil desconocida: {token} (usa {', '.join((*PRECISIONS, *OPTIONS))})")
+        return cls(precision, 'int8' in options, 'channels_last' in options, 'compile' in options)
+
+    @property
+    def torch_dtype(self) -> torch.dtype:
+        return PRECISIONS[self.precision]
+
+    @property
+    def name(self) -> str:
+        return '+'.join([self.precision] + [option for option in OPTIONS if getattr(self, option)])
+
+    def __repr__(self):
+        return f"InferenceProfile({self.name})"
+
+def default_profile(device: torch.device) -> str:
+    # fp16 solo compensa (y solo está bien soportado) en GPU; en CPU la referencia es fp32
+    return 'fp16' if device.type == 'cuda' else 'fp32'
+
+def apply_profile(pipe, profile: InferenceProfile):
+    """
+    Aplica un perfil a un pipeline ya cargado en fp32, modificando sus módulos en el sitio. El
+    pipeline no debe compartir módulos con un Trainer: la cuantización es irreversible.
+
+    Args:
+        pipe (StableDiffusionControlNetPipeline): Pipeline cargado en fp32.
+        profile (InferenceProfile): Perfil a aplicar.
+
+    Returns:
+        El mismo pipeline.
+    """
+    if profile.precision == 'fp16' and pipe.device.type != 'cuda':
+        raise ValueError(f"La precisión fp16 solo está soportada en GPU (dispositivo: {pipe.device.type}); usa fp32 o bf16")
+    if profile.precision != 'fp32':
+        pipe.to(dtype=profile.torch_dtype)
+
+    if profile.int8:
+        if pipe.device.type != 'cpu':
+            raise ValueError("La cuantización dinámica int8 solo está disponible en CPU")
+        for name in ('unet', 'text_encoder'):
+            module = getattr(pipe, name)
+            torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+            logger.info(f"Capas Linear de {name} cuantizadas a int8")
+
+    if profile.channels_last:
+        for name in ('unet', 'controlnet', 'vae'):
+            module = getattr(pipe, name, None)
+            if module is not None:
+                module.to(memory_format=torch.channels_last)
+
+    if profile.compile:
+        pipe.unet = torch.compile(pipe.unet)
+
+    logger.info(f"Perfil de inferencia aplicado: {profile.name}")
+    return pipe
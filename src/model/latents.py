@@ -0,0 +1,99 @@
+import os
+import json
+import numpy as np
+import torch
+from diffusers import AutoencoderKL
+from torchvision import transforms
+from PIL import Image
+
+from src.model.training import load_image
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class LatentPrecomputer:
+    def __init__(self, dataset_file: str, vae_pretrained: str, output_file: str, cache_dir: str = 'cache',
+                 image_size: int = 512, batch_size: int = 16, flip_variants: bool = False, shard_path: str = None):
+        """
+        Paso de preprocesado que codifica cada imagen del dataset una sola vez con el VAE y guarda
+        los latentes en un shard .npy (N x V x C x h x w, float16) mapeable en memoria.
+
+        Args:
+            dataset_file (str): Ruta al JSON generado por DatasetBuilder.
+            vae_pretrained (str): Modelo AutoencoderKL a utilizar.
+            output_file (str): Ruta del shard de latentes (.npy).
+            cache_dir (str, optional): Directorio de caché de Hugging Face.
+            image_size (int, optional): Resolución a la que se codifican las imágenes.
+            batch_size (int, optional): Imágenes por lote de codificación.
+            flip_variants (bool, optional): Guarda también el latente de la imagen volteada en horizontal.
+            shard_path (str, optional): Shard de imágenes de DatasetBuilder, si existe.
+        """
+        self.dataset_file = dataset_file
+        self.vae_pretrained = vae_pretrained
+        self.output_file = output_file
+        self.cache_dir = cache_dir
+        self.image_size = image_size
+        self.batch_size = batch_size
+        self.flip_variants = flip_variants
+        self.shard_path = shard_path
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.transform = transforms.Compose([
+            transforms.Resize((image_size, image_size)),
+            transforms.ToTensor(),
+            transforms.Normalize([0.5]*3, [0.5]*3)
+        ])
+
+    def load_images(self, entries, shard):
+        images = []
+        for entry in entries:
+            if shard is not None:
+                image = Image.fromarray(shard[entry['shard_index']]).convert('RGB')
+            else:
+                image = load_image(entry['image_path'])
+            images.append(self.transform(image))
+        return torch.stack(images)
+
+    def process(self):
+        with open(self.dataset_file, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+        shard = np.load(self.shard_path, mmap_mode='r') if self.shard_path else None
+
+        vae = AutoencoderKL.from_pretrained(self.vae_pretrained, cache_dir=self.cache_dir).to(self.device).eval()
+        scaling_factor = vae.config.scaling_factor
+        downsample = 2 ** (len(vae.config.block_out_channels) - 1)
+        latent_size = self.image_size // downsample
+        variants = 2 if self.flip_variants else 1
+        shape = (len(dataset), variants, vae.config.latent_channels, latent_size, latent_size)
+        logger.info(f"Codificando {len(dataset)} imágenes con el VAE en latentes de forma {shape}")
+
+        os.makedirs(os.path.dirname(self.output_file) or '.', exist_ok=True)
+        tmp_path = f"{self.output_file}.tmp"
+        latents = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float16, shape=shape)
+        with torch.no_grad():
+            for start in range(0, len(dataset), self.batch_size):
+                pixel_values = self.load_images(dataset[start:start + self.batch_size], shard).to(self.device)
+                batch_variants = [pixel_values, torch.flip(pixel_values, dims=[3])][:variants]
+                for variant, images in enumerate(batch_variants):
+                    # Se guarda la media de la distribución: el latente es determinista y reproducible
+                    encoded = vae.encode(images).latent_dist.mean * scaling_factor
+                    latents[start:start + len(images), variant] = encoded.to(torch.float16).cpu().numpy()
+                logger.debug(f"Latentes codificados: {min(start + self.batch_size, len(dataset))}/{len(dataset)}")
+        latents.flush()
+        del latents
+        os.replace(tmp_path, self.output_file)
+
+        with open(self.metadata_file(self.output_file), 'w', encoding='utf-8') as f:
+            json.dump({
+                'shape': list(shape),
+                'dtype': 'float16',
+                'scaling_factor': scaling_factor,
+                'vae_pretrained': self.vae_pretrained,
+                'image_size': self.image_size,
+                'flip_variants': self.flip_variants,
+                'dataset_file': self.dataset_file
+            }, f, indent=2)
+        logger.info(f"Latentes guardados en {self.output_file}")
+
+    @staticmethod
+    def metadata_file(latents_file: str) -> str:
+        return f"{os.path.splitext(latents_file)[0]}.meta.json"
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import resource
+from contextlib import contextmanager
+import torch
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+def read_proc_status_mb(field: str) -> float:
+    """Devuelve un campo de /proc/self/status (VmRSS, VmHWM) en MB, o None si no está disponible."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_memory(device: torch.device) -> bool:
+    """
+    Reinicia el pico de memoria para medir solo una ventana (p. ej. el bucle de entrenamiento, sin
+    la carga de modelos): las estadísticas de CUDA o, en CPU, el pico de RSS del proceso (VmHWM,
+    escribiendo 5 en /proc/self/clear_refs, Linux).
+
+    Args:
+        device (torch.device): Dispositivo de entrenamiento.
+
+    Returns:
+        bool: True si se ha reiniciado; False si el pico sigue siendo el de toda la vida del proceso.
+    """
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+        return True
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def current_memory_mb(device: torch.device) -> float:
+    """Devuelve la memoria en uso en MB: la asignada por tensores en CUDA o el RSS actual en CPU."""
+    if device.type == 'cuda':
+        return torch.cuda.memory_allocated(device) / 2**20
+    return read_proc_status_mb('VmRSS') or 0.0
+
+def peak_memory_mb(device: torch.device) -> float:
+    """
+    Devuelve el pico de memoria en MB desde el último reset_peak_memory (o desde el arranque del
+    proceso): memoria reservada por tensores en CUDA o RSS máximo del proceso en CPU.
+
+    Args:
+        device (torch.device): Dispositivo de entrenamiento.
+
+    Returns:
+        float: Pico de memoria en MB.
+    """
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    peak = read_proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    # Sin /proc: ru_maxrss (en KB en Linux) no se puede reiniciar y cubre toda la vida del proceso
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class StepTimer:
+    def __init__(self, device: torch.device, metrics_file: str = None):
+        """
+        Mide el tiempo de cada fase de un paso de entrenamiento (espera de datos, codificación,
+        forward, backward, optimizador) y escribe un registro JSONL por paso. En CUDA se sincroniza
+        al cerrar cada fase para que el tiempo se atribuya a la fase que lo consume y no a la
+        siguiente que espere al dispositivo.
+
+        Args:
+            device (torch.device): Dispositivo de entrenamiento.
+            metrics_file (str, optional): Archivo JSONL de métricas; None para no escribirlo.
+        """
+        self.device = device
+        self.metrics_file = metrics_file
+        self.phases = {}
+        self.totals = {}
+        self.steps = 0
+        self._step_start = None
+        self._file = None
+        if metrics_file:
+            os.makedirs(os.path.dirname(metrics_file) or '.', exist_ok=True)
+            self._file = open(metrics_file, 'a', encoding='utf-8', buffering=1)
+
+    def start_step(self):
+        self.phases = {}
+        self._step_start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Mide una fase del paso actual. Las fases repetidas (p. ej. en cada micro-lote) se acumulan.
+        La fase aparece además con su nombre en las trazas de torch.profiler.
+
+        Args:
+            name (str): Nombre de la fase.
+        """
+        start = time.perf_counter()
+        with torch.profiler.record_function(name):
+            yield
+            if self.device.type == 'cuda':
+                torch.cuda.synchronize(self.device)
+        self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def end_step(self, step: int, samples: int, **extra) -> dict:
+        """
+        Cierra el paso actual y escribe su registro.
+
+        Args:
+            step (int): Número del paso.
+            samples (int): Muestras procesadas en el paso.
+            **extra: Campos adicionales del registro (pérdida, época, lr...).
+
+        Returns:
+            dict: Registro del paso.
+        """
+        step_time = time.perf_counter() - self._step_start
+        record = {
+            'step': step,
+            **extra,
+            'step_time': step_time,
+            'samples_per_s': samples / step_time if step_time else 0.0,
+            'phases': self.phases,
+            'peak_memory_mb': peak_memory_mb(self.device)
+        }
+        self.steps += 1
+        self.totals['step_time'] = self.totals.get('step_time', 0.0) + step_time
+        self.totals['samples'] = self.totals.get('samples', 0) + samples
+        for name, seconds in self.phases.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+        if self._file is not None:
+            self._file.write(json.dumps(record) + '\n')
+        return record
+
+    def summary(self) -> dict:
+        """Devuelve la media por paso de cada fase y las muestras/s globales."""
+        if not self.steps:
+            return {}
+        step_time = self.totals['step_time']
+        summary = {name: seconds / self.steps for name, seconds in self.totals.items() if name not in ('step_time', 'samples')}
+        summary['step_time'] = step_time / self.steps
+        summary['samples_per_s'] = self.totals['samples'] / step_time if step_time else 0.0
+        return summary
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class ProfilerWindow:
+    def __init__(self, device: torch.device, start_step: int, num_steps: int, trace_dir: str):
+        """
+        Ventana de pasos perfilada con torch.profiler. Al cerrarse exporta una traza de Chrome
+        (chrome://tracing o Perfetto) y registra las operaciones más costosas.
+
+        Args:
+            device (torch.device): Dispositivo de entrenamiento.
+            start_step (int): Primer paso perfilado.
+            num_steps (int): Número de pasos perfilados.
+            trace_dir (str): Directorio de las trazas.
+        """
+        self.start_step = start_step
+        self.end_step = start_step + num_steps
+        self.trace_dir = trace_dir
+        self.activities = [torch.profiler.ProfilerActivity.CPU]
+        if device.type == 'cuda':
+            self.activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.sort_by = 'cuda_time_total' if device.type == 'cuda' else 'cpu_time_total'
+        self._profiler = None
+
+    @classmethod
+    def from_config(cls, config: dict, device: torch.device):
+        """Crea la ventana a partir de la sección `metrics.profiler`, o devuelve None si está desactivada."""
+        if not config or not config.get('enabled', False):
+            return None
+        return cls(device, config.get('start_step', 10), config.get('num_steps', 5), config.get('trace_dir', 'profiler'))
+
+    def step(self, step: int):
+        """
+        Debe llamarse al comienzo de cada paso; arranca y detiene el profiler en los límites de la ventana.
+
+        Args:
+            step (int): Número (desde 0) del paso que comienza.
+        """
+        if step == self.start_step and self._profiler is None:
+            self._profiler = torch.profiler.profile(activities=self.activities, record_shapes=True, profile_memory=True)
+            self._profiler.start()
+            logger.info(f"Profiler activado en los pasos {self.start_step}-{self.end_step - 1}")
+        elif step == self.end_step:
+            self.stop()
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        self._profiler.stop()
+        os.makedirs(self.trace_dir, exist_ok=True)
+        trace_file = os.path.join(self.trace_dir, f"trace_steps_{self.start_step}-{self.end_step - 1}.json")
+        self._profiler.export_chrome_trace(trace_file)
+        logger.info(f"Traza del profiler guardada en {trace_file}")
+        logger.info("\n" + self._profiler.key_averages().table(sort_by=self.sort_by, row_limit=15))
+        self._profiler = None
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+import torch
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class PromptEmbeddingCache:
+    def __init__(self, pipe, max_entries: int = 256):
+        """
+        Caché LRU acotada de embeddings de prompts para inferencia. La clave es el texto del prompt
+        junto con la identidad del text encoder (modelo, tipo y dispositivo), de modo que un prompt
+        repetido, incluido el negativo, no vuelve a pasar por el tokenizador ni por CLIP.
+
+        Args:
+            pipe (StableDiffusionControlNetPipeline): Pipeline cuyo `encode_prompt` calcula los embeddings.
+            max_entries (int, optional): Número máximo de prompts guardados.
+        """
+        self.pipe = pipe
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def identity(self) -> tuple:
+        text_encoder = self.pipe.text_encoder
+        return (text_encoder.config._name_or_path, str(text_encoder.dtype), str(text_encoder.device))
+
+    def encode(self, prompts: list) -> torch.Tensor:
+        """
+        Devuelve los embeddings de los prompts, codificando en un solo lote los que no estén en caché.
+
+        Args:
+            prompts (list): Textos de los prompts.
+
+        Returns:
+            torch.Tensor: Embeddings (len(prompts) x max_length x D).
+        """
+        identity = self.identity
+        with self.lock:
+            cached = {prompt: self.entries.get((identity, prompt)) for prompt in dict.fromkeys(prompts)}
+            for prompt, embedding in cached.items():
+                if embedding is not None:
+                    self.entries.move_to_end((identity, prompt))
+            missing = [prompt for prompt, embedding in cached.items() if embedding is None]
+            # Un prompt repetido dentro del lote solo se codifica una vez: cuenta como acierto
+            self.misses += len(missing)
+            self.hits += len(prompts) - len(missing)
+
+        if missing:
+            with torch.no_grad():
+                embeddings, _ = self.pipe.encode_prompt(missing, self.pipe.device, 1, False)
+            with self.lock:
+                for prompt, embedding in zip(missing, embeddings):
+                    # Copia propia: una vista de fila retendría el lote entero tras desalojar las demás
+                    embedding = embedding.clone()
+                    cached[prompt] = embedding
+                    self.entries[(identity, prompt)] = embedding
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return torch.stack([cached[prompt] for prompt in prompts])
+
+    def pipe_kwargs(self, prompts: list, negative_prompts: list = None) -> dict:
+        """
+        Argumentos `prompt_embeds`/`negative_prompt_embeds` del pipeline para un lote de prompts.
+
+        Args:
+            prompts (list): Prompts del lote.
+            negative_prompts (list, optional): Prompts negativos (por defecto, el vacío).
+
+        Returns:
+            dict: Argumentos para el pipeline en lugar de `prompt`/`negative_prompt`.
+        """
+        return {
+            'prompt_embeds': self.encode(prompts),
+            'negative_prompt_embeds': self.encode(negative_prompts or [""] * len(prompts))
+        }
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries)
+            }
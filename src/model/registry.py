@@ -0,0 +1,150 @@
+import torch
+import diffusers
+from transformers import CLIPTextModel, CLIPTokenizer
+from diffusers import (
+    AutoencoderKL,
+    ControlNetModel,
+    DDPMScheduler,
+    StableDiffusionControlNetPipeline,
+    UNet2DConditionModel,
+)
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class ComponentRegistry:
+    def __init__(self, config: dict, device: torch.device, cache_dir: str, torch_dtype: torch.dtype = torch.float32):
+        """
+        Registro perezoso de los componentes del modelo. Cada componente se carga la primera vez que
+        se pide y se devuelve siempre la misma instancia, de modo que el Trainer y cualquier pipeline
+        de muestreo comparten pesos en lugar de cargar copias propias.
+
+        Args:
+            config (dict): Diccionario de configuración (sección `model`).
+            device (torch.device): Dispositivo de los módulos.
+            cache_dir (str): Directorio de caché de Hugging Face.
+            torch_dtype (torch.dtype, optional): Tipo de los pesos de los módulos.
+        """
+        self.config = config
+        self.device = device
+        self.cache_dir = cache_dir
+        self.torch_dtype = torch_dtype
+        self._components = {}
+        self._loaders = {
+            'tokenizer': self._load_tokenizer,
+            'text_encoder': self._load_text_encoder,
+            'unet': self._load_unet,
+            'vae': self._load_vae,
+            'noise_scheduler': self._load_noise_scheduler,
+            'inference_scheduler': self._load_inference_scheduler,
+            'controlnet': self._load_controlnet,
+            'pipeline': self._load_pipeline,
+        }
+
+    def get(self, name: str):
+        """
+        Devuelve el componente, cargándolo si es la primera vez que se pide.
+
+        Args:
+            name (str): Nombre del componente.
+
+        Returns:
+            El componente compartido.
+        """
+        if name not in self._components:
+            if name not in self._loaders:
+                raise KeyError(f"Componente desconocido: {name}")
+            self._components[name] = self._loaders[name]()
+            logger.info(f"Componente cargado: {name}")
+        return self._components[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._components
+
+    def release(self, name: str):
+        """
+        Suelta la referencia del registro a un componente para que pueda liberarse su memoria.
+
+        Args:
+            name (str): Nombre del componente.
+        """
+        if self._components.pop(name, None) is not None:
+            logger.info(f"Componente liberado: {name}")
+            if self.device.type == 'cuda':
+                torch.cuda.empty_cache()
+
+    @property
+    def model_config(self) -> dict:
+        return self.config['model']
+
+    def _load_tokenizer(self):
+        return CLIPTokenizer.from_pretrained(self.model_config['tokenizer_pretrained'], cache_dir=self.cache_dir)
+
+    def _load_text_encoder(self):
+        text_encoder = CLIPTextModel.from_pretrained(
+            self.model_config['text_encoder_pretrained'],
+            cache_dir=self.cache_dir,
+            torch_dtype=self.torch_dtype
+        ).to(self.device)
+        text_encoder.requires_grad_(False)
+        return text_encoder
+
+    def _load_unet(self):
+        # Sin `unet_pretrained` se usa la subcarpeta unet del modelo principal
+        if 'unet_pretrained' in self.model_config:
+            source, subfolder = self.model_config['unet_pretrained'], None
+        else:
+            source, subfolder = self.model_config['pretrained_model_name_or_path'], 'unet'
+        return UNet2DConditionModel.from_pretrained(
+            source,
+            subfolder=subfolder,
+            cache_dir=self.cache_dir,
+            torch_dtype=self.torch_dtype
+        ).to(self.device)
+
+    def _load_vae(self):
+        vae = AutoencoderKL.from_pretrained(
+            self.model_config['vae_pretrained'],
+            cache_dir=self.cache_dir,
+            torch_dtype=self.torch_dtype
+        ).to(self.device)
+        vae.requires_grad_(False)
+        return vae
+
+    def _load_noise_scheduler(self):
+        return DDPMScheduler.from_pretrained(
+            self.model_config.get('scheduler_pretrained', "runwayml/stable-diffusion-v1-5"),
+            subfolder="scheduler",
+            cache_dir=self.cache_dir
+        )
+
+    def _load_inference_scheduler(self):
+        # Instancia propia para muestrear: set_timesteps no debe alterar el scheduler de add_noise del Trainer
+        scheduler_class = getattr(diffusers, self.model_config.get('inference_scheduler') or 'PNDMScheduler')
+        return scheduler_class.from_config(self.get('noise_scheduler').config)
+
+    def _load_controlnet(self):
+        # Sin `controlnet_pretrained` el ControlNet se inicializa a partir del UNet, como al empezar a entrenarlo
+        if not self.model_config.get('controlnet_pretrained'):
+            controlnet = ControlNetModel.from_unet(self.get('unet'))
+            return controlnet.to(self.device, dtype=self.torch_dtype)
+        return ControlNetModel.from_pretrained(
+            self.model_config['controlnet_pretrained'],
+            cache_dir=self.cache_dir,
+            torch_dtype=self.torch_dtype
+        ).to(self.device)
+
+    def _load_pipeline(self):
+        # El pipeline se ensambla con los mismos módulos que usa el Trainer: no se cargan copias
+        return StableDiffusionControlNetPipeline(
+            vae=self.get('vae'),
+            text_encoder=self.get('text_encoder'),
+            tokenizer=self.get('tokenizer'),
+            unet=self.get('unet'),
+            controlnet=self.get('controlnet'),
+            scheduler=self.get('inference_scheduler'),
+            safety_checker=None,        # Desactiva el safety_checker
+            feature_extractor=None,
+            requires_safety_checker=False
+        )
@@ -0,0 +1,102 @@
+import os
+import torch
+import torch.multiprocessing as mp
+from torch.utils.data import get_worker_info
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class SharedSampleCache:
+    def __init__(self, num_samples: int, height: int, width: int, budget_bytes: int):
+        """
+        Caché de muestras decodificadas (uint8, H x W) en memoria compartida, visible para todos los
+        workers del DataLoader. Es de correspondencia directa: la muestra `idx` ocupa la ranura
+        `idx % num_slots`, de modo que si el presupuesto no alcanza para todo el dataset las muestras
+        que comparten ranura se desalojan entre sí.
+
+        Las lecturas no toman ningún lock: cada ranura lleva un contador de versión que el escritor
+        deja impar mientras copia (seqlock), y una lectura que lo ve cambiar cuenta como fallo.
+
+        Args:
+            num_samples (int): Número de muestras del dataset.
+            height (int): Alto de las muestras cacheadas.
+            width (int): Ancho de las muestras cacheadas.
+            budget_bytes (int): Memoria máxima para los píxeles cacheados.
+        """
+        self.height = height
+        self.width = width
+        self.num_slots = max(1, min(num_samples, budget_bytes // (height * width)))
+        self.pixels = torch.zeros((self.num_slots, height, width), dtype=torch.uint8).share_memory_()
+        self.owner = torch.full((self.num_slots,), -1, dtype=torch.int64).share_memory_()
+        self.version = torch.zeros(self.num_slots, dtype=torch.int64).share_memory_()
+        # Aciertos y fallos por proceso (fila 0: proceso principal; fila i + 1: worker i): cada fila
+        # tiene un único escritor, así que los incrementos no se pierden sin necesidad de lock. La
+        # última fila recoge, bajo el lock, a los workers que no caben
+        self.counters = torch.zeros((os.cpu_count() + 2, 2), dtype=torch.int64).share_memory_()
+        # Solo serializa a los escritores entre sí
+        self.lock = mp.Lock()
+        logger.info(f"Caché de muestras compartida: {self.num_slots}/{num_samples} ranuras de {height}x{width} "
+                    f"({self.pixels.numel() / 2**20:.1f} MB)")
+
+    def get(self, idx: int):
+        """
+        Devuelve una copia de la muestra cacheada, o None si no está en la caché.
+
+        Args:
+            idx (int): Índice de la muestra en el dataset.
+
+        Returns:
+            torch.Tensor: Tensor uint8 (H x W), o None.
+        """
+        slot = idx % self.num_slots
+        version = self.version[slot].item()
+        if version % 2 == 0 and self.owner[slot].item() == idx:
+            pixels = self.pixels[slot].clone()
+            # Si un escritor ha tocado la ranura durante la copia, la copia puede estar a medias
+            if self.version[slot].item() == version:
+                self.count(hit=True)
+                return pixels
+        self.count(hit=False)
+        return None
+
+    def count(self, hit: bool):
+        worker_info = get_worker_info()
+        row = 0 if worker_info is None else worker_info.id + 1
+        if row < len(self.counters) - 1:
+            self.counters[row, 0 if hit else 1] += 1
+        else:
+            with self.lock:
+                self.counters[-1, 0 if hit else 1] += 1
+
+    def put(self, idx: int, pixels: torch.Tensor):
+        """
+        Guarda una muestra decodificada, desalojando la que ocupara su ranura.
+
+        Args:
+            idx (int): Índice de la muestra en el dataset.
+            pixels (torch.Tensor): Tensor uint8 (H x W).
+        """
+        slot = idx % self.num_slots
+        with self.lock:
+            self.version[slot] += 1
+            self.owner[slot] = idx
+            self.pixels[slot].copy_(pixels)
+            self.version[slot] += 1
+
+    @property
+    def hits(self) -> int:
+        return int(self.counters[:, 0].sum())
+
+    @property
+    def misses(self) -> int:
+        return int(self.counters[:, 1].sum())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'slots': self.num_slots
+        }
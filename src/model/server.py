@@ -0,0 +1,347 @@
+import io
+import json
+import time
+import base64
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import torch
+from PIL import Image
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class QueueFullError(Exception):
+    """La cola del servidor está llena: el cliente debe reintentar más tarde."""
+
+class GenerationRequest:
+    def __init__(self, prompt: str, num_inference_steps: int = 50, guidance_scale: float = 7.5, size: int = 512,
+                 seed: int = None, negative_prompt: str = ""):
+        # Se valida antes de encolar: una petición inválida haría fallar a todo su micro-lote
+        if not isinstance(prompt, str) or not isinstance(negative_prompt, str):
+            raise ValueError("prompt y negative_prompt deben ser texto")
+        if num_inference_steps < 1:
+            raise ValueError(f"num_inference_steps debe ser al menos 1 (recibido {num_inference_steps})")
+        if size <= 0 or size % 8 != 0:
+            raise ValueError(f"size debe ser un múltiplo positivo de 8 (recibido {size})")
+        self.prompt = prompt
+        self.negative_prompt = negative_prompt
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.size = size
+        self.seed = seed
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.batch_size = None
+        self.image = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    @property
+    def batch_key(self) -> tuple:
+        # Solo se agrupan peticiones que el pipeline puede atender en una misma llamada
+        return (self.size, self.num_inference_steps, self.guidance_scale)
+
+    def metrics(self) -> dict:
+        return {
+            'queue_ms': (self.started_at - self.enqueued_at) * 1000,
+            'inference_ms': (self.finished_at - self.started_at) * 1000,
+            'total_ms': (self.finished_at - self.enqueued_at) * 1000,
+            'batch_size': self.batch_size
+        }
+
+class MicroBatcher:
+    def __init__(self, pipe, control_image: Image.Image, max_batch_size: int = 8, max_wait_ms: float = 50,
+                 max_queue: int = 64, prompt_cache=None):
+        """
+        Agrupa las peticiones en micro-lotes sobre un pipeline ya cargado. Un hilo atiende la cola:
+        toma la petición más antigua, espera como mucho `max_wait_ms` desde su llegada a que lleguen
+        otras compatibles (mismo tamaño, pasos y guidance) y las genera en una sola llamada. Con más
+        de `max_queue` peticiones en cola, las nuevas se rechazan (QueueFullError).
+
+        Args:
+            pipe (StableDiffusionControlNetPipeline): Pipeline cargado.
+            control_image (Image.Image): Imagen de control de ControlNet.
+            max_batch_size (int, optional): Peticiones por micro-lote.
+            max_wait_ms (float, optional): Espera máxima para completar un micro-lote.
+            max_queue (int, optional): Peticiones en cola como máximo.
+            prompt_cache (PromptEmbeddingCache, optional): Caché de embeddings de prompts.
+        """
+        self.pipe = pipe
+        self.prompt_cache = prompt_cache
+        self.control_image = control_image
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.latencies = deque(maxlen=1000)
+        self.batch_sizes = deque(maxlen=1000)
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, request: GenerationRequest) -> GenerationRequest:
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"Cola llena ({self.max_queue} peticiones)")
+            self.queue.append(request)
+            self.condition.notify()
+        return request
+
+    def cancel(self, request: GenerationRequest) -> bool:
+        """
+        Cancela una petición cuyo cliente ya no espera la respuesta (p. ej. tras un 504), para que no
+        ocupe un hueco de un micro-lote.
+
+        Returns:
+            bool: True si seguía en cola y se ha retirado; False si ya se estaba generando.
+        """
+        with self.condition:
+            request.cancelled = True
+            if request in self.queue:
+                self.queue.remove(request)
+                self.cancelled += 1
+                return True
+            return False
+
+    def next_batch(self) -> list:
+        """Espera a la siguiente petición y reúne las compatibles hasta llenar el lote o agotar la espera."""
+        with self.condition:
+            while self.running and not self.queue:
+                self.condition.wait()
+            if not self.running:
+                return []
+            first = self.queue[0]
+            deadline = first.enqueued_at + self.max_wait
+            while True:
+                compatible = [request for request in self.queue if request.batch_key == first.batch_key and not request.cancelled]
+                remaining = deadline - time.perf_counter()
+                if len(compatible) >= self.max_batch_size or remaining <= 0 or not self.running:
+                    break
+                self.condition.wait(remaining)
+            batch = compatible[:self.max_batch_size]
+            for request in batch:
+                self.queue.remove(request)
+            return batch
+
+    def _run(self):
+        while self.running:
+            batch = self.next_batch()
+            if batch:
+                self.generate(batch)
+
+    def generate(self, batch: list):
+        started_at = time.perf_counter()
+        first = batch[0]
+        prompts = [request.prompt for request in batch]
+        negative_prompts = [request.negative_prompt for request in batch]
+        try:
+            generators = None
+            if any(request.seed is not None for request in batch):
+                generators = [torch.Generator(device=self.pipe.device) for _ in batch]
+                for generator, request in zip(generators, batch):
+                    # Las peticiones sin semilla que comparten lote con otras que sí la tienen siguen siendo aleatorias
+                    if request.seed is not None:
+                        generator.manual_seed(request.seed)
+                    else:
+                        generator.seed()
+            if self.prompt_cache is not None:
+                prompt_kwargs = self.prompt_cache.pipe_kwargs(prompts, negative_prompts)
+            else:
+                prompt_kwargs = {'prompt': prompts, 'negative_prompt': negative_prompts}
+            with torch.no_grad():
+                images = self.pipe(
+                    **prompt_kwargs,
+                    image=self.control_image,
+                    num_inference_steps=first.num_inference_steps,
+                    guidance_scale=first.guidance_scale,
+                    height=first.size,
+                    width=first.size,
+                    generator=generators
+                ).images
+            error = None
+        except Exception as e:
+            logger.error(f"Error al generar un lote de {len(batch)} peticiones: {e}")
+            images, error = [None] * len(batch), e
+
+        finished_at = time.perf_counter()
+        for request, image in zip(batch, images):
+            request.started_at, request.finished_at = started_at, finished_at
+            request.batch_size = len(batch)
+            request.image, request.error = image, error
+            request.done.set()
+        with self.condition:
+            self.completed += len(batch)
+            self.batch_sizes.append(len(batch))
+            self.latencies.extend(request.metrics()['total_ms'] for request in batch)
+
+    def stats(self) -> dict:
+        with self.condition:
+            latencies = sorted(self.latencies)
+            batch_sizes = list(self.batch_sizes)
+            queued = len(self.queue)
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0.0
+
+        stats = {
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+            'queued': queued,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'mean_batch_size': sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0
+        }
+        if self.prompt_cache is not None:
+            stats['prompt_cache'] = self.prompt_cache.stats()
+        return stats
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+def encode_png(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def make_handler(batcher: MicroBatcher, defaults: dict, timeout: float):
+    class GenerationHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            elif self.path == '/metrics':
+                self.send_json(200, batcher.stats())
+            else:
+                self.send_json(404, {'error': f"Ruta desconocida: {self.path}"})
+
+        def do_POST(self):
+            if self.path != '/generate':
+                self.send_json(404, {'error': f"Ruta desconocida: {self.path}"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                request = GenerationRequest(
+                    payload['prompt'],
+                    num_inference_steps=int(payload.get('num_inference_steps', defaults['num_inference_steps'])),
+                    guidance_scale=float(payload.get('guidance_scale', defaults['guidance_scale'])),
+                    size=int(payload.get('size', defaults['size'])),
+                    seed=int(payload['seed']) if payload.get('seed') is not None else None,
+                    negative_prompt=payload.get('negative_prompt', "")
+                )
+            except (KeyError, ValueError, TypeError) as e:
+                self.send_json(400, {'error': f"Petición no válida: {e}"})
+                return
+            try:
+                batcher.submit(request)
+            except QueueFullError as e:
+                self.send_json(503, {'error': str(e)})
+                return
+            if not request.done.wait(timeout):
+                batcher.cancel(request)
+                self.send_json(504, {'error': f"Sin respuesta tras {timeout}s"})
+                return
+            if request.error is not None:
+                self.send_json(500, {'error': str(request.error)})
+                return
+            # La codificación PNG ocurre en el hilo de la conexión, no en el del pipeline
+            self.send_json(200, {'image': encode_png(request.image), 'metrics': request.metrics()})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    return GenerationHandler
+
+def serve(pipe, control_image: Image.Image, host: str = '127.0.0.1', port: int = 8765, max_batch_size: int = 8,
+          max_wait_ms: float = 50, max_queue: int = 64, timeout: float = 600, defaults: dict = None, prompt_cache=None):
+    """
+    Sirve el pipeline ya cargado por HTTP hasta que se interrumpe el proceso.
+
+    Rutas: POST /generate ({"prompt", "negative_prompt", "num_inference_steps", "guidance_scale", "size", "seed"} ->
+    {"image": PNG en base64, "metrics"}), GET /metrics y GET /health.
+
+    Args:
+        pipe (StableDiffusionControlNetPipeline): Pipeline cargado (se mantiene caliente).
+        control_image (Image.Image): Imagen de control de ControlNet.
+        host (str, optional): Dirección de escucha.
+        port (int, optional): Puerto.
+        max_batch_size (int, optional): Peticiones por micro-lote.
+        max_wait_ms (float, optional): Espera máxima para completar un micro-lote.
+        max_queue (int, optional): Peticiones en cola como máximo (después, 503).
+        timeout (float, optional): Segundos máximos de espera de una petición.
+        defaults (dict, optional): Valores por defecto de num_inference_steps, guidance_scale y size.
+        prompt_cache (PromptEmbeddingCache, optional): Caché de embeddings de prompts.
+    """
+    defaults = {'num_inference_steps': 50, 'guidance_scale': 7.5, 'size': 512, **(defaults or {})}
+    batcher = MicroBatcher(pipe, control_image, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, max_queue=max_queue,
+                           prompt_cache=prompt_cache)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, defaults, timeout))
+    logger.info(f"Servidor de generación escuchando en http://{host}:{port} "
+                f"(lotes de hasta {max_batch_size}, espera máxima {max_wait_ms} ms, cola de {max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Deteniendo el servidor de generación.")
+    finally:
+        server.server_close()
+        batcher.close()
+        logger.info(f"Métricas finales: {batcher.stats()}")
+
+class GenerationClient:
+    def __init__(self, url: str = 'http://127.0.0.1:8765', timeout: float = 600):
+        """
+        Cliente del servidor de generación.
+
+        Args:
+            url (str, optional): URL base del servidor.
+            timeout (float, optional): Segundos máximos de espera por petición.
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def generate(self, prompt: str, **options) -> tuple:
+        """
+        Pide una imagen al servidor.
+
+        Args:
+            prompt (str): Prompt de texto.
+            **options: negative_prompt, num_inference_steps, guidance_scale, size, seed.
+
+        Returns:
+            tuple: (imagen PIL, métricas de latencia de la petición).
+        """
+        body = json.dumps({'prompt': prompt, **{key: value for key, value in options.items() if value is not None}})
+        request = urllib.request.Request(f"{self.url}/generate", data=body.encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"El servidor respondió {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+        image = Image.open(io.BytesIO(base64.b64decode(payload['image'])))
+        return image, payload['metrics']
+
+    def metrics(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/metrics", timeout=self.timeout) as response:
+            return json.loads(response.read())
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+class TextEmbeddingCache:
+    def __init__(self, cache_dir: str, tokenizer_name: str, text_encoder_name: str, max_length: int = 77):
+        """
+        Caché persistente de `last_hidden_state` de CLIP para los captions del dataset. Los embeddings
+        se guardan en float16 en un .npy mapeado en memoria (U x max_length x D) junto a un índice
+        JSON caption -> fila. El nombre de los archivos depende del tokenizador, del text encoder y
+        de max_length, de modo que cambiar cualquiera de ellos invalida la caché.
+
+        Args:
+            cache_dir (str): Directorio donde se guardan los archivos de la caché.
+            tokenizer_name (str): Identificador del tokenizador.
+            text_encoder_name (str): Identificador del text encoder.
+            max_length (int, optional): Longitud de tokenizado.
+        """
+        self.cache_dir = cache_dir
+        self.max_length = max_length
+        self.identity = {'tokenizer': tokenizer_name, 'text_encoder': text_encoder_name, 'max_length': max_length}
+        key = hashlib.sha256(json.dumps(self.identity, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.embeddings_file = os.path.join(cache_dir, f"text_embeddings_{key}.npy")
+        self.index_file = os.path.join(cache_dir, f"text_embeddings_{key}.json")
+        self.index = None
+        self._embeddings = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.embeddings_file) and os.path.exists(self.index_file)
+
+    def covers(self, captions) -> bool:
+        """Indica si la caché existe y contiene todos los captions dados."""
+        if not self.exists():
+            return False
+        self.load()
+        return all(caption in self.index for caption in captions)
+
+    def build(self, captions, tokenizer, text_encoder, device: torch.device, batch_size: int = 64):
+        """
+        Codifica por lotes cada caption único una sola vez y escribe la caché.
+
+        Args:
+            captions (iterable): Captions del dataset (puede haber repetidos).
+            tokenizer (transformers.PreTrainedTokenizer): Tokenizador CLIP.
+            text_encoder (transformers.CLIPTextModel): Text encoder CLIP.
+            device (torch.device): Dispositivo donde se ejecuta el text encoder.
+            batch_size (int, optional): Captions por lote.
+        """
+        unique_captions = sorted(set(captions))
+        hidden_size = text_encoder.config.hidden_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.embeddings_file}.tmp"
+        embeddings = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float16, shape=(len(unique_captions), self.max_length, hidden_size)
+        )
+        logger.info(f"Codificando {len(unique_captions)} captions únicos para la caché de embeddings")
+
+        text_encoder.eval()
+        with torch.no_grad():
+            for start in range(0, len(unique_captions), batch_size):
+                batch = unique_captions[start:start + batch_size]
+                encoding = tokenizer(
+                    batch,
+                    truncation=True,
+                    padding='max_length',
+                    max_length=self.max_length,
+                    return_tensors='pt'
+                )
+                hidden_states = text_encoder(
+                    encoding['input_ids'].to(device),
+                    attention_mask=encoding['attention_mask'].to(device)
+                ).last_hidden_state
+                embeddings[start:start + len(batch)] = hidden_states.to(torch.float16).cpu().numpy()
+        embeddings.flush()
+        del embeddings
+        os.replace(tmp_path, self.embeddings_file)
+
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'identity': self.identity,
+                'captions': {caption: row for row, caption in enumerate(unique_captions)}
+            }, f, ensure_ascii=False)
+        self.index = None
+        self._embeddings = None
+        logger.info(f"Caché de embeddings guardada en {self.embeddings_file}")
+
+    def load(self):
+        if self.index is None:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)['captions']
+        return self
+
+    @property
+    def embeddings(self):
+        # Se mapea de forma perezosa en cada proceso (workers del DataLoader incluidos)
+        if self._embeddings is None:
+            self._embeddings = np.load(self.embeddings_file, mmap_mode='c')
+        return self._embeddings
+
+    def get(self, caption: str) -> torch.Tensor:
+        """
+        Devuelve el `last_hidden_state` en float16 de un caption.
+
+        Args:
+            caption (str): Caption a buscar.
+
+        Returns:
+            torch.Tensor: Tensor (max_length x D) en float16, sin copia del archivo mapeado.
+        """
+        self.load()
+        return torch.from_numpy(self.embeddings[self.index[caption]])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_embeddings'] = None
+        return state
@@ -1,71 +1,267 @@
 import os
+import time
+from contextlib import nullcontext
 import yaml
 import json
+import hashlib
+import numpy as np
 import torch
-from torch.utils.data import DataLoader
-from transformers import AdamW, get_scheduler, CLIPTextModel, CLIPTokenizer
-from diffusers import UNet2DConditionModel, AutoencoderKL, DDPMScheduler, StableDiffusionControlNetPipeline
+from torch.utils.data import DataLoader, default_collate
+from transformers import AdamW, get_scheduler
 from torch import nn
-from torchvision import transforms
+from torch.nn.parallel import DistributedDataParallel
 from rich.progress import track
 from torch.utils.data import Dataset
 from PIL import Image
 
+from src.model.checkpointing import CheckpointWriter, load_checkpoint, rng_state, set_rng_state, to_cpu
+from src.model.data_stream import EpochSampler, InfiniteBatchStream
+from src.model.distributed import all_gather_object, get_rank, get_world_size, main_process_first
+from src.model.profiling import ProfilerWindow, StepTimer, current_memory_mb, peak_memory_mb, reset_peak_memory
+from src.model.registry import ComponentRegistry
+from src.model.sample_cache import SharedSampleCache
+from src.model.text_cache import TextEmbeddingCache
+from src.model.transforms import BatchTransform, expand_channels
 from src.utils.logger import get_logger
 
 logger = get_logger()
 
+def load_image(image_path: str) -> Image.Image:
+    """
+    Carga una imagen del dataset, ya sea PNG o un array uint8 en escala de grises (.npy).
+
+    Args:
+        image_path (str): Ruta a la imagen.
+
+    Returns:
+        Image.Image: Imagen en modo RGB.
+    """
+    if image_path.endswith('.npy'):
+        return Image.fromarray(np.load(image_path)).convert('RGB')
+    return Image.open(image_path).convert('RGB')
+
+def caption_for(item: dict) -> str:
+    """
+    Devuelve el caption de una entrada del dataset: su campo 'text' o, si no existe, sus significados.
+
+    Args:
+        item (dict): Entrada del dataset generado por DatasetBuilder.
+
+    Returns:
+        str: Caption asociado al kanji.
+    """
+    return item.get('text') or ', '.join(item['meanings'])
+
 class KanjiDataset(Dataset):
-    def __init__(self, dataset_path: str, transform=None, tokenizer=None, max_length: int = 77):
+    def __init__(self, dataset_path: str, transform=None, tokenizer=None, max_length: int = 77,
+                 shard_path: str = None, latents_path: str = None, text_embeddings: TextEmbeddingCache = None,
+                 tokens_path: str = None, sample_cache_bytes: int = None, sample_size: int = None):
         """
         Inicializa el dataset de Kanji.
 
         Args:
             dataset_path (str): Ruta al archivo JSON del dataset.
-            transform (callable, optional): Transformaciones a aplicar a las imágenes.
+            transform (callable, optional): Transformaciones por muestra sobre la imagen PIL en RGB. Sin
+                ella, el dataset devuelve la imagen en crudo (uint8, 1 x H x W) para que BatchTransform
+                la procese por lotes.
             tokenizer (transformers.PreTrainedTokenizer, optional): Tokenizador para los textos.
             max_length (int, optional): Longitud máxima para el tokenizado.
+            shard_path (str, optional): Shard .npy (N x H x W uint8) generado por DatasetBuilder.
+                Si se indica, las imágenes se leen del shard mapeado en memoria en lugar de abrir
+                un PNG por muestra.
+            latents_path (str, optional): Shard de latentes generado por LatentPrecomputer. Si se
+                indica, el dataset devuelve 'latents' en lugar de 'pixel_values' y no lee imágenes.
+            text_embeddings (TextEmbeddingCache, optional): Caché de embeddings de texto. Si se indica,
+                el dataset devuelve 'encoder_hidden_states' en lugar de tokenizar el caption.
+            tokens_path (str, optional): Archivo .npz donde persistir la tabla de tokens de los captions
+                para no volver a tokenizarlos en la siguiente ejecución.
+            sample_cache_bytes (int, optional): Presupuesto de una caché en memoria compartida de
+                muestras decodificadas, común a todos los workers del DataLoader.
+            sample_size (int, optional): Resolución de las muestras cacheadas; por defecto, la de las
+                imágenes de origen (BatchTransform redimensiona después en el dispositivo).
         """
         with open(dataset_path, 'r') as f:
             self.data = json.load(f)
         self.transform = transform
         self.tokenizer = tokenizer
         self.max_length = max_length
+        self.shard_path = shard_path
+        self._shard = None
+        self.latents_path = latents_path
+        self._latents = None
+        self.text_embeddings = text_embeddings
+        if latents_path is not None and len(self.latents) != len(self.data):
+            raise ValueError(f"El shard de latentes tiene {len(self.latents)} filas y el dataset {len(self.data)}")
+
+        self.sample_cache = None
+        if sample_cache_bytes and latents_path is None:
+            height, width = (sample_size, sample_size) if sample_size else self.source_size()
+            self.sample_cache = SharedSampleCache(len(self.data), height, width, sample_cache_bytes)
+
+        # Todos los captions se tokenizan una sola vez; collate() solo indexa filas de la tabla
+        self.input_ids = None
+        self.attention_mask = None
+        if tokenizer is not None and text_embeddings is None:
+            self.input_ids, self.attention_mask = self.build_token_table(tokens_path)
+
+    def build_token_table(self, tokens_path: str = None):
+        """
+        Tokeniza por lotes todos los captions y devuelve `input_ids` (int32) y `attention_mask` (uint8)
+        como arrays N x max_length. Si se indica `tokens_path`, reutiliza la tabla guardada cuando
+        coinciden tokenizador, max_length y captions, y la guarda en caso contrario.
+
+        Args:
+            tokens_path (str, optional): Ruta del archivo .npz de la tabla de tokens.
+
+        Returns:
+            tuple: (input_ids, attention_mask).
+        """
+        captions = [caption_for(item) for item in self.data]
+        identity = json.dumps({
+            'tokenizer': getattr(self.tokenizer, 'name_or_path', type(self.tokenizer).__name__),
+            'max_length': self.max_length,
+            'captions': hashlib.sha256('\n'.join(captions).encode('utf-8')).hexdigest()
+        }, sort_keys=True)
+
+        if tokens_path and os.path.exists(tokens_path):
+            with np.load(tokens_path) as table:
+                if str(table['identity']) == identity:
+                    logger.info(f"Tabla de tokens cargada desde {tokens_path}")
+                    return table['input_ids'], table['attention_mask']
+
+        encoding = self.tokenizer(
+            captions,
+            truncation=True,
+            padding='max_length',
+            max_length=self.max_length,
+            return_tensors='np'
+        )
+        input_ids = encoding['input_ids'].astype(np.int32)
+        attention_mask = encoding['attention_mask'].astype(np.uint8)
+        logger.info(f"Tokenizados {len(captions)} captions.")
+
+        if tokens_path:
+            os.makedirs(os.path.dirname(tokens_path) or '.', exist_ok=True)
+            np.savez(tokens_path, identity=np.array(identity), input_ids=input_ids, attention_mask=attention_mask)
+            logger.info(f"Tabla de tokens guardada en {tokens_path}")
+        return input_ids, attention_mask
+
+    @property
+    def shard(self):
+        # Se abre de forma perezosa para que cada worker del DataLoader mapee el archivo por su cuenta
+        # y todos compartan la page cache; 'c' (copy-on-write) permite vistas sin copia y escribibles.
+        if self._shard is None:
+            self._shard = np.load(self.shard_path, mmap_mode='c')
+        return self._shard
+
+    @property
+    def latents(self):
+        if self._latents is None:
+            self._latents = np.load(self.latents_path, mmap_mode='c')
+        return self._latents
+
+    def __getstate__(self):
+        # Los workers no necesitan el tokenizador: los tokens ya están en la tabla
+        state = self.__dict__.copy()
+        state['_shard'] = None
+        state['_latents'] = None
+        state['tokenizer'] = None
+        return state
 
     def __len__(self):
         return len(self.data)
 
+    def source_size(self) -> tuple:
+        """Devuelve (alto, ancho) de las imágenes de origen: las del shard o, sin shard, la de la primera imagen."""
+        if self.shard_path is not None:
+            return tuple(self.shard.shape[1:3])
+        return self.load_pixels(self.data[0]).shape[:2]
+
+    def load_pixels(self, item: dict, size: tuple = None) -> np.ndarray:
+        """
+        Carga una imagen como array uint8 (H x W) en escala de grises, desde el shard o desde disco.
+
+        Args:
+            item (dict): Entrada del dataset.
+            size (tuple, optional): (ancho, alto) al que redimensionar la imagen.
+
+        Returns:
+            np.ndarray: Píxeles de la imagen.
+        """
+        if self.shard_path is not None:
+            pixels = self.shard[item['shard_index']]
+        elif item['image_path'].endswith('.npy'):
+            pixels = np.load(item['image_path'])
+        else:
+            with Image.open(item['image_path']) as img:
+                pixels = np.asarray(img.convert('L'))
+        if size is not None and pixels.shape[::-1] != tuple(size):
+            pixels = np.asarray(Image.fromarray(pixels).resize(size, Image.BILINEAR))
+        return pixels
+
+    def get_pixels(self, idx: int, item: dict) -> np.ndarray:
+        """
+        Devuelve los píxeles uint8 (H x W) de una muestra, pasando por la caché compartida si existe.
+
+        Args:
+            idx (int): Índice de la muestra.
+            item (dict): Entrada del dataset.
+
+        Returns:
+            np.ndarray: Píxeles de la imagen.
+        """
+        if self.sample_cache is None:
+            return np.ascontiguousarray(self.load_pixels(item))
+        pixels = self.sample_cache.get(idx)
+        if pixels is None:
+            pixels = torch.from_numpy(np.ascontiguousarray(
+                self.load_pixels(item, (self.sample_cache.width, self.sample_cache.height))
+            ))
+            self.sample_cache.put(idx, pixels)
+        return pixels.numpy()
+
     def __getitem__(self, idx: int):
         item = self.data[idx]
-        image_path = item['image_path']
-        text = item['text']
-
-        # Cargar y transformar la imagen
-        image = Image.open(image_path).convert('RGB')
-        if self.transform:
-            image = self.transform(image)
-
-        # Tokenizar el texto
-        if self.tokenizer:
-            encoding = self.tokenizer(
-                text,
-                truncation=True,
-                padding='max_length',
-                max_length=self.max_length,
-                return_tensors='pt'
-            )
-            input_ids = encoding['input_ids'].squeeze()
-            attention_mask = encoding['attention_mask'].squeeze()
-        else:
-            input_ids = None
-            attention_mask = None
 
-        return {
-            'pixel_values': image,
-            'input_ids': input_ids,
-            'attention_mask': attention_mask
+        # Cargar y transformar la imagen (o su latente precalculado)
+        if self.latents_path is not None:
+            # Las filas del shard siguen el orden del dataset; se elige una variante (p. ej. volteada) al azar
+            variant = torch.randint(self.latents.shape[1], (1,)).item()
+            image = torch.from_numpy(self.latents[idx, variant]).float()
+        else:
+            pixels = self.get_pixels(idx, item)
+            if self.transform:
+                image = self.transform(Image.fromarray(pixels).convert('RGB'))
+            else:
+                image = torch.from_numpy(pixels).unsqueeze(0)
+
+        sample = {
+            'latents' if self.latents_path is not None else 'pixel_values': image,
+            'index': idx
         }
-    
+        # Embedding precalculado del texto; los tokens los añade collate() desde la tabla
+        if self.text_embeddings is not None:
+            sample['encoder_hidden_states'] = self.text_embeddings.get(caption_for(item))
+        return sample
+
+    def collate(self, samples: list) -> dict:
+        """
+        Agrupa muestras en un lote, añadiendo `input_ids`/`attention_mask` por indexación de la
+        tabla de tokens precalculada.
+
+        Args:
+            samples (list): Muestras devueltas por __getitem__.
+
+        Returns:
+            dict: Lote con los tensores apilados.
+        """
+        batch = default_collate(samples)
+        if self.input_ids is not None:
+            rows = batch['index'].numpy()
+            batch['input_ids'] = torch.from_numpy(self.input_ids[rows]).long()
+            batch['attention_mask'] = torch.from_numpy(self.attention_mask[rows]).long()
+        return batch
+
 class Trainer:
     def __init__(self, config: dict):
         """
@@ -76,8 +272,20 @@ class Trainer:
         """
         self.config = config
 
+        # Entrenamiento distribuido: si hay un grupo de procesos inicializado, cada rank entrena sobre
+        # su parte del dataset y los gradientes del UNet se promedian entre ranks
+        self.rank = get_rank()
+        self.world_size = get_world_size()
+        self.is_main_process = self.rank == 0
+        if self.world_size > 1:
+            # Cada rank necesita su propia secuencia de ruido y timesteps
+            torch.manual_seed(self.config['training'].get('seed', 0) + self.rank)
+
         # Configuración del dispositivo
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if torch.cuda.is_available():
+            self.device = torch.device("cuda", self.rank % torch.cuda.device_count()) if self.world_size > 1 else torch.device("cuda")
+        else:
+            self.device = torch.device("cpu")
         logger.info(f"Usando dispositivo: {self.device}")
 
         # Configuración del caché de Hugging Face
@@ -85,30 +293,48 @@ class Trainer:
         os.makedirs(self.cache_dir, exist_ok=True)
         logger.info(f"Usando directorio de caché personalizado: {self.cache_dir}")
 
+        # Registro de componentes: cada modelo se carga solo cuando el modo actual lo necesita y
+        # la misma instancia se comparte con el pipeline de muestreo
+        self.components = ComponentRegistry(self.config, self.device, self.cache_dir)
+
         # Cargar el tokenizador y el modelo de texto
-        self.tokenizer = CLIPTokenizer.from_pretrained(
-            self.config['model']['tokenizer_pretrained'],
-            cache_dir=self.cache_dir
-        )
-        self.text_encoder = CLIPTextModel.from_pretrained(
-            self.config['model']['text_encoder_pretrained'],
-            cache_dir=self.cache_dir
-        ).to(self.device)
-        logger.info("Tokenizador y Text Encoder cargados.")
+        self.tokenizer = self.components.get('tokenizer')
+
+        # Caché de embeddings: con ella el text encoder no se necesita durante el entrenamiento.
+        # La construye solo el rank 0; el resto la reutiliza.
+        with main_process_first():
+            self.text_embeddings = self.setup_text_embedding_cache()
+        self.text_encoder = self.components.get('text_encoder') if self.text_embeddings is None else None
 
         # Cargar el modelo UNet
-        self.unet = UNet2DConditionModel.from_pretrained(
-            self.config['model']['unet_pretrained'],
-            cache_dir=self.cache_dir
-        ).to(self.device)
-        logger.info("UNet cargado.")
-
-        # Cargar el VAE
-        self.vae = AutoencoderKL.from_pretrained(
-            self.config['model']['vae_pretrained'],
-            cache_dir=self.cache_dir
-        ).to(self.device)
-        logger.info("VAE cargado.")
+        self.unet = self.components.get('unet')
+
+        # Cargar el VAE, salvo en modo latente, donde los latentes ya están precalculados
+        self.latents_path = self.config['data'].get('latents_path')
+        if self.latents_path:
+            self.vae = None
+            logger.info(f"Modo latente: usando {self.latents_path}, el VAE no se carga.")
+        else:
+            self.vae = self.components.get('vae')
+
+        # Modo de memoria acotada: acumulación de gradientes, autocast bf16 y checkpointing de activaciones
+        self.gradient_accumulation_steps = self.config['training'].get('gradient_accumulation_steps', 1)
+        self.mixed_precision = self.config['training'].get('mixed_precision', 'no')
+        if self.mixed_precision not in ('no', 'bf16'):
+            raise ValueError(f"mixed_precision no soportado: {self.mixed_precision} (usa 'no' o 'bf16')")
+        if self.config['training'].get('gradient_checkpointing', False):
+            self.unet.enable_gradient_checkpointing()
+        logger.info(f"Acumulación de gradientes: {self.gradient_accumulation_steps} micro-lotes, "
+                    f"precisión mixta: {self.mixed_precision}, "
+                    f"checkpointing de activaciones: {self.config['training'].get('gradient_checkpointing', False)}")
+
+        # Con varios procesos el UNet se envuelve en DDP, que promedia los gradientes en el backward;
+        # `self.unet` sigue siendo el módulo sin envolver (checkpoints, pipeline)
+        if self.world_size > 1:
+            self.model = DistributedDataParallel(self.unet, device_ids=[self.device.index] if self.device.type == 'cuda' else None)
+            logger.info(f"Entrenamiento distribuido con {self.world_size} procesos.")
+        else:
+            self.model = self.unet
 
         # Configurar el optimizador
         self.optimizer = AdamW(self.unet.parameters(), lr=float(self.config['training']['learning_rate']))
@@ -127,47 +353,87 @@ class Trainer:
         self.criterion = nn.MSELoss()
         logger.info("Función de pérdida (MSELoss) establecida.")
 
-        # Configurar el dataset y dataloader utilizando KanjiDataset
-        transform = transforms.Compose([
-            transforms.Resize((self.config['data']['image_size'], self.config['data']['image_size'])),
-            transforms.ToTensor(),
-            transforms.Normalize([0.5]*3, [0.5]*3)
-        ])
-
-        self.dataset = KanjiDataset(
-            dataset_path=self.config['data']['dataset_path'],
-            transform=transform,
-            tokenizer=self.tokenizer,
-            max_length=77
+        # Transformaciones por lotes en el dispositivo
+        augment = self.config['data'].get('augment') or {}
+        self.batch_transform = BatchTransform(
+            self.config['data']['image_size'],
+            max_translate=augment.get('max_translate', 0.0),
+            max_scale=augment.get('max_scale', 0.0)
         )
 
+        # Configurar el dataset y dataloader utilizando KanjiDataset. El rank 0 construye primero la
+        # tabla de tokens (si falta) y el resto la reutiliza.
+        with main_process_first():
+            self.dataset = self.build_dataset()
+
+        # DataLoader de larga vida: workers persistentes y un flujo infinito que cambia de época
+        # (y de permutación) sin volver a lanzar los workers en cada paso
+        num_workers = self.config['data']['num_workers']
+        self.sampler = EpochSampler(
+            len(self.dataset),
+            shuffle=True,
+            seed=self.config['training'].get('seed', 0),
+            num_replicas=self.world_size,
+            rank=self.rank
+        )
         self.dataloader = DataLoader(
             self.dataset,
             batch_size=self.config['training']['batch_size'],
-            shuffle=True,
-            num_workers=self.config['data']['num_workers']
+            sampler=self.sampler,
+            num_workers=num_workers,
+            collate_fn=self.dataset.collate,
+            pin_memory=self.device.type == 'cuda',
+            persistent_workers=num_workers > 0,
+            prefetch_factor=self.config['data'].get('prefetch_factor', 2) if num_workers > 0 else None
         )
+        self.batch_stream = InfiniteBatchStream(self.dataloader, self.sampler)
         logger.info("Dataset y DataLoader inicializados.")
 
-        self.load_pipeline()
+        # Checkpoints escritos en segundo plano, conservando solo los últimos
+        self.checkpoint_writer = CheckpointWriter(
+            self.config['training']['output_dir'],
+            keep_last=self.config['training'].get('keep_last_checkpoints', 3)
+        )
+        self.start_step = 0
+
+        # Telemetría: tiempos por fase de cada paso en JSONL y ventana opcional de torch.profiler
+        metrics_config = self.config.get('metrics') or {}
+        self.timer = StepTimer(self.device, metrics_config.get('metrics_file') if self.is_main_process else None)
+        self.profiler = ProfilerWindow.from_config(metrics_config.get('profiler'), self.device) if self.is_main_process else None
+
+    def build_dataset(self):
+        """
+        Crea el KanjiDataset del entrenamiento. Las imágenes llegan en crudo (uint8, un canal) y se
+        transforman por lotes en el dispositivo.
+
+        Returns:
+            KanjiDataset: Dataset de entrenamiento.
+        """
+        return KanjiDataset(
+            dataset_path=self.config['data']['dataset_path'],
+            transform=None,
+            tokenizer=self.tokenizer,
+            max_length=77,
+            shard_path=self.config['data'].get('shard_path'),
+            latents_path=self.latents_path,
+            text_embeddings=self.text_embeddings,
+            tokens_path=self.config['data'].get('tokens_path'),
+            sample_cache_bytes=int(self.config['data'].get('sample_cache_mb') or 0) * 2**20
+        )
+
+    @property
+    def pipeline(self):
+        return self.load_pipeline()
 
     def load_pipeline(self):
         """
-        Carga el pipeline de Stable Diffusion con ControlNet.
+        Devuelve el pipeline de Stable Diffusion con ControlNet, ensamblado la primera vez que se pide
+        con los mismos módulos (UNet, VAE, text encoder) que usa el entrenamiento.
         """
         try:
-            controlnet = UNet2DConditionModel.from_pretrained(
-                self.config['model']['controlnet_pretrained'],
-                cache_dir=self.cache_dir
-            ).to(self.device)
-
-            self.pipeline = StableDiffusionControlNetPipeline.from_pretrained(
-                self.config['model']['pretrained_model_name_or_path'],
-                controlnet=controlnet,
-                safety_checker=None,        # Desactiva el safety_checker
-                torch_dtype=torch.float32    # Cambiado a float32 para compatibilidad con CPU
-            ).to(self.device)
-            logger.info("Pipeline cargado exitosamente sin safety_checker.")
+            pipeline = self.components.get('pipeline')
+            logger.info("Pipeline disponible sin safety_checker, compartiendo pesos con el Trainer.")
+            return pipeline
         except Exception as e:
             logger.error(f"Error al cargar el pipeline: {e}")
             raise e
@@ -179,59 +445,229 @@ class Trainer:
         logger.info("Iniciando proceso de entrenamiento.")
         self.unet.train()
 
-        noise_scheduler = DDPMScheduler.from_pretrained(
-            "runwayml/stable-diffusion-v1-5",
-            subfolder="scheduler",
-            cache_dir=self.cache_dir
-        )
-        
-        for step in track(range(self.config['training']['total_steps']), description="Entrenando..."):
-            for batch in self.dataloader:
-                pixel_values = batch['pixel_values'].to(self.device)
-                input_ids = batch['input_ids'].to(self.device)
-                attention_mask = batch['attention_mask'].to(self.device)
+        noise_scheduler = self.components.get('noise_scheduler')
+        total_steps = self.config['training']['total_steps']
+        # El pico de memoria se mide desde aquí: sin la carga de modelos ni entrenamientos anteriores del proceso
+        self.memory_window = reset_peak_memory(self.device)
+        self.memory_baseline = current_memory_mb(self.device)
+        start_time = time.perf_counter()
+
+        # Cada paso es una actualización del optimizador (y del scheduler de LR), acumulando
+        # gradientes sobre `gradient_accumulation_steps` micro-lotes
+        for step in track(range(self.start_step, total_steps), description="Entrenando...", disable=not self.is_main_process):
+            if self.profiler is not None:
+                self.profiler.step(step)
+            self.timer.start_step()
+            step_loss = 0.0
+            samples = 0
+            for micro_step in range(self.gradient_accumulation_steps):
+                with self.timer.phase('data'):
+                    batch = next(self.batch_stream)
+                samples += len(batch['index']) * self.world_size
+
+                # Con DDP los gradientes solo se promedian entre ranks en el último micro-lote
+                last_micro_step = micro_step == self.gradient_accumulation_steps - 1
+                with self.model.no_sync() if self.world_size > 1 and not last_micro_step else nullcontext():
+                    loss = self.compute_loss(batch, noise_scheduler) / self.gradient_accumulation_steps
+
+                    # Backpropagation
+                    with self.timer.phase('backward'):
+                        loss.backward()
+                        step_loss += loss.item()
+
+            with self.timer.phase('optimizer'):
+                self.optimizer.step()
+                self.scheduler.step()
+                self.optimizer.zero_grad(set_to_none=True)
 
-                # Codificar texto
-                with torch.no_grad():
-                    encoder_hidden_states = self.text_encoder(input_ids, attention_mask=attention_mask).last_hidden_state
+            record = self.timer.end_step(
+                step + 1, samples,
+                epoch=self.batch_stream.epoch,
+                loss=step_loss,
+                lr=self.scheduler.get_last_lr()[0]
+            )
+            logger.info(f"Paso {step+1}/{total_steps} - Época {self.batch_stream.epoch} - Pérdida: {step_loss:.4f} - "
+                        f"{record['samples_per_s']:.1f} muestras/s")
+
+            # Guardar checkpoint
+            if (step + 1) % self.config['training']['checkpoint_interval'] == 0:
+                self.save_checkpoint(step + 1)
+                if self.dataset.sample_cache is not None:
+                    logger.info(f"Caché de muestras: {self.dataset.sample_cache.stats()}")
+
+        if self.dataset.sample_cache is not None:
+            logger.info(f"Caché de muestras: {self.dataset.sample_cache.stats()}")
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.checkpoint_writer.wait()
+        self.timer.close()
+        self.report_memory(total_steps - self.start_step, time.perf_counter() - start_time)
+        logger.info("Tiempo medio por paso y fase (s): " + ", ".join(
+            f"{name}={value:.4f}" for name, value in self.timer.summary().items() if name != 'samples_per_s'
+        ) + f" - {self.timer.summary().get('samples_per_s', 0.0):.1f} muestras/s")
+        logger.info("Entrenamiento completado exitosamente.")
+
+    def compute_loss(self, batch: dict, noise_scheduler) -> torch.Tensor:
+        """
+        Calcula la pérdida de difusión de un micro-lote, bajo autocast bf16 si está configurado.
 
+        Args:
+            batch (dict): Lote del DataLoader.
+            noise_scheduler: Scheduler de ruido de entrenamiento.
+
+        Returns:
+            torch.Tensor: Pérdida MSE entre el ruido predicho y el añadido.
+        """
+        with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.mixed_precision == 'bf16'):
+            with self.timer.phase('latents'):
+                latents = self.get_latents(batch)
+
+            # Codificar texto
+            with self.timer.phase('text_encode'):
+                encoder_hidden_states = self.get_encoder_hidden_states(batch)
+
+            with self.timer.phase('forward'):
                 # Muestrear timesteps aleatorios
-                timesteps = torch.randint(0, noise_scheduler.num_train_timesteps, (pixel_values.shape[0],), device=self.device).long()
+                timesteps = torch.randint(0, noise_scheduler.config.num_train_timesteps, (latents.shape[0],), device=self.device).long()
 
-                # Añadir ruido a las imágenes
-                noisy_images = noise_scheduler.add_noise(pixel_values, torch.randn_like(pixel_values), timesteps)
+                # Añadir ruido a los latentes
+                noise = torch.randn_like(latents)
+                noisy_latents = noise_scheduler.add_noise(latents, noise, timesteps)
 
                 # Predicción del ruido con UNet
-                noise_pred = self.unet(noisy_images, timesteps, encoder_hidden_states).sample
+                noise_pred = self.model(noisy_latents, timesteps, encoder_hidden_states).sample
 
-                # Cálculo de la pérdida
-                loss = self.criterion(noise_pred, noisy_images)
+        # Cálculo de la pérdida respecto al ruido añadido, siempre en float32
+        return self.criterion(noise_pred.float(), noise.float())
 
-                # Backpropagation
-                loss.backward()
-                self.optimizer.step()
-                self.scheduler.step()
-                self.optimizer.zero_grad()
+    def report_memory(self, steps: int, elapsed: float):
+        """
+        Resume la configuración de memoria usada, su pico de memoria y la velocidad obtenida, para
+        comparar configuraciones y elegir la más rápida que quepa.
+
+        Args:
+            steps (int): Pasos de optimizador ejecutados.
+            elapsed (float): Tiempo transcurrido en segundos.
+        """
+        training_config = self.config['training']
+        if self.memory_window:
+            memory = (f"pico de memoria durante el entrenamiento: {peak_memory_mb(self.device):.0f} MB "
+                      f"({self.memory_baseline:.0f} MB al empezar)")
+        else:
+            memory = f"pico de memoria del proceso (incluye la carga de modelos): {peak_memory_mb(self.device):.0f} MB"
+        logger.info(
+            f"Configuración: batch_size={training_config['batch_size']}, "
+            f"gradient_accumulation_steps={self.gradient_accumulation_steps}, "
+            f"mixed_precision={self.mixed_precision}, "
+            f"gradient_checkpointing={training_config.get('gradient_checkpointing', False)} - "
+            f"{memory}, "
+            f"{steps / elapsed if elapsed else 0.0:.3f} pasos/s"
+        )
+        
+    def get_latents(self, batch: dict) -> torch.Tensor:
+        """
+        Devuelve los latentes del lote: los precalculados si el dataset está en modo latente o,
+        en caso contrario, los obtenidos codificando las imágenes con el VAE.
 
-                logger.info(f"Paso {step+1}/{self.config['training']['total_steps']} - Pérdida: {loss.item():.4f}")
+        Args:
+            batch (dict): Lote del DataLoader.
+
+        Returns:
+            torch.Tensor: Latentes escalados por el scaling_factor del VAE.
+        """
+        if 'latents' in batch:
+            return batch['latents'].to(self.device, non_blocking=True)
+        # Se transfiere el lote uint8 de un canal; los 3 canales solo se materializan para el VAE
+        pixel_values = self.batch_transform(batch['pixel_values'].to(self.device, non_blocking=True))
+        with torch.no_grad():
+            return self.vae.encode(expand_channels(pixel_values)).latent_dist.sample() * self.vae.config.scaling_factor
+
+    def setup_text_embedding_cache(self):
+        """
+        Prepara la caché de embeddings de texto si `data.text_embedding_cache` está configurado,
+        construyéndola si falta algún caption. El text encoder solo se carga para construirla.
+
+        Returns:
+            TextEmbeddingCache: La caché, o None si no está configurada.
+        """
+        cache_dir = self.config['data'].get('text_embedding_cache')
+        if not cache_dir:
+            return None
+
+        cache = TextEmbeddingCache(
+            cache_dir,
+            tokenizer_name=self.config['model']['tokenizer_pretrained'],
+            text_encoder_name=self.config['model']['text_encoder_pretrained'],
+            max_length=77
+        )
+        with open(self.config['data']['dataset_path'], 'r') as f:
+            captions = [caption_for(item) for item in json.load(f)]
+        if not cache.covers(captions):
+            cache.build(captions, self.tokenizer, self.components.get('text_encoder'), self.device)
+            self.components.release('text_encoder')
+        logger.info(f"Usando caché de embeddings de texto {cache.embeddings_file}; el Text Encoder no se mantiene cargado.")
+        return cache
+
+    def get_encoder_hidden_states(self, batch: dict) -> torch.Tensor:
+        """
+        Devuelve los embeddings de texto del lote, precalculados o calculados con el text encoder.
 
-                # Guardar checkpoint
-                if (step + 1) % self.config['training']['checkpoint_interval'] == 0:
-                    self.save_checkpoint(step + 1)
+        Args:
+            batch (dict): Lote del DataLoader.
 
-                # Avanzar al siguiente paso
-                break
+        Returns:
+            torch.Tensor: `last_hidden_state` del text encoder en float32.
+        """
+        if 'encoder_hidden_states' in batch:
+            return batch['encoder_hidden_states'].to(self.device, non_blocking=True).float()
+        input_ids = batch['input_ids'].to(self.device, non_blocking=True)
+        attention_mask = batch['attention_mask'].to(self.device, non_blocking=True)
+        with torch.no_grad():
+            return self.text_encoder(input_ids, attention_mask=attention_mask).last_hidden_state
 
-        logger.info("Entrenamiento completado exitosamente.")
-        
     def save_checkpoint(self, step: int):
         """
-        Guarda el estado actual del modelo.
+        Guarda el estado completo de entrenamiento. Solo la copia a CPU ocurre en el bucle de
+        entrenamiento; la escritura a disco la hace el CheckpointWriter en segundo plano. Con varios
+        procesos debe llamarse en todos los ranks (se reúne el estado aleatorio de cada uno), pero
+        solo el rank 0 escribe.
 
         Args:
             step (int): Número del paso actual.
         """
-        checkpoint_dir = os.path.join(self.config['training']['output_dir'], f"step_{step}")
-        os.makedirs(checkpoint_dir, exist_ok=True)
-        self.unet.save_pretrained(checkpoint_dir)
-        logger.info(f"Checkpoint guardado en el paso {step} en {checkpoint_dir}")
\ No newline at end of file
+        rng_states = all_gather_object(rng_state())
+        if not self.is_main_process:
+            return
+        start = time.perf_counter()
+        unet_state = to_cpu(self.unet.state_dict())
+        training_state = {
+            'step': step,
+            'optimizer': to_cpu(self.optimizer.state_dict()),
+            'scheduler': self.scheduler.state_dict(),
+            'rng': rng_states,
+            'data_stream': self.batch_stream.state_dict()
+        }
+        self.checkpoint_writer.save(step, unet_state, self.unet.to_json_string(), training_state)
+        logger.info(f"Checkpoint del paso {step} copiado en {time.perf_counter() - start:.2f}s; escribiendo en segundo plano.")
+
+    def resume(self, checkpoint_dir: str):
+        """
+        Restaura el estado guardado por save_checkpoint para continuar el entrenamiento exactamente
+        donde se dejó: pesos del UNet, optimizador, scheduler de LR, generadores aleatorios y
+        posición en el flujo de datos.
+
+        Args:
+            checkpoint_dir (str): Directorio del checkpoint (step_N).
+        """
+        weights, state = load_checkpoint(checkpoint_dir)
+        self.unet.load_state_dict(weights)
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scheduler.load_state_dict(state['scheduler'])
+        rng_states = state['rng'] if isinstance(state['rng'], list) else [state['rng']]
+        if self.rank < len(rng_states):
+            set_rng_state(rng_states[self.rank])
+        else:
+            logger.warning(f"El checkpoint no tiene estado aleatorio para el rank {self.rank}; se mantiene la semilla actual.")
+        self.batch_stream.load_state_dict(state['data_stream'])
+        self.start_step = state['step']
+        logger.info(f"Entrenamiento reanudado desde {checkpoint_dir} (paso {self.start_step}).")
@@ -0,0 +1,61 @@
+import torch
+import torch.nn.functional as F
+
+class BatchTransform:
+    def __init__(self, image_size: int, max_translate: float = 0.0, max_scale: float = 0.0):
+        """
+        Transformaciones vectorizadas sobre lotes completos de imágenes uint8 de un canal
+        (B x 1 x H x W): redimensionado, normalización a [-1, 1] y aumentación opcional.
+        Sustituye al Compose de torchvision aplicado imagen a imagen.
+
+        Args:
+            image_size (int): Resolución de salida.
+            max_translate (float, optional): Desplazamiento aleatorio máximo, como fracción del tamaño.
+            max_scale (float, optional): Variación aleatoria máxima de escala (p. ej. 0.1 = ±10%).
+        """
+        self.image_size = image_size
+        self.max_translate = max_translate
+        self.max_scale = max_scale
+
+    def __call__(self, pixels: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            pixels (torch.Tensor): Lote uint8 (B x 1 x H x W).
+
+        Returns:
+            torch.Tensor: Lote float32 (B x 1 x image_size x image_size) en [-1, 1].
+        """
+        images = pixels.float().div_(255.0)
+        if images.shape[-2:] != (self.image_size, self.image_size):
+            images = F.interpolate(images, size=(self.image_size, self.image_size), mode='bilinear',
+                                   align_corners=False, antialias=True)
+        if self.max_translate or self.max_scale:
+            images = self.augment(images)
+        return images.mul_(2.0).sub_(1.0)
+
+    def augment(self, images: torch.Tensor) -> torch.Tensor:
+        # Una única transformación afín por lote, con parámetros aleatorios por muestra. Los bordes
+        # replican el fondo blanco. No se voltea: un kanji volteado es otro carácter (o ninguno).
+        batch_size = images.shape[0]
+        scale = 1.0 + (torch.rand(batch_size, device=images.device) * 2 - 1) * self.max_scale
+        shift = (torch.rand(batch_size, 2, device=images.device) * 2 - 1) * self.max_translate * 2
+        theta = torch.zeros(batch_size, 2, 3, device=images.device)
+        theta[:, 0, 0] = 1.0 / scale
+        theta[:, 1, 1] = 1.0 / scale
+        theta[:, :, 2] = shift
+        grid = F.affine_grid(theta, images.shape, align_corners=False)
+        return F.grid_sample(images, grid, mode='bilinear', padding_mode='border', align_corners=False)
+
+def expand_channels(images: torch.Tensor, channels: int = 3) -> torch.Tensor:
+    """
+    Repite el canal de gris para los modelos que esperan RGB. Devuelve una vista (stride 0), sin
+    copiar datos, por lo que debe llamarse justo en la frontera con el modelo.
+
+    Args:
+        images (torch.Tensor): Lote (B x 1 x H x W).
+        channels (int, optional): Número de canales de salida.
+
+    Returns:
+        torch.Tensor: Lote (B x channels x H x W).
+    """
+    return images.expand(-1, channels, -1, -1)
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Los módulos del proyecto se importan como src.* y configs.*, y el logger lee su configuración
+# con una ruta relativa a la raíz del proyecto
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
@@ -0,0 +1,78 @@
+import os
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import json
+import struct
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+pytest.importorskip("transformers")
+pytest.importorskip("safetensors")
+pytest.importorskip("accelerate")
+
+from benchmarks.tiny_models import IMAGE_SIZE, save_tiny_components
+from src.model.bundle import MODEL_COMPONENTS, ModelBundle, export_bundle
+from src.model.registry import ComponentRegistry
+
+@pytest.fixture(scope="module")
+def registry(tmp_path_factory):
+    root = tmp_path_factory.mktemp("tiny")
+    config = {'model': save_tiny_components(str(root / "models"))}
+    return ComponentRegistry(config, torch.device('cpu'), str(root / "hf_cache"))
+
+def export(registry, path, **kwargs) -> str:
+    return export_bundle(str(path), {name: registry.get(name) for name in MODEL_COMPONENTS},
+                         scheduler=registry.get('inference_scheduler'), tokenizer=registry.get('tokenizer'), **kwargs)
+
+def test_round_trip_restores_every_component(registry, tmp_path):
+    bundle = ModelBundle(export(registry, tmp_path / "bundle.safetensors"))
+    assert bundle.components == list(MODEL_COMPONENTS)
+    for name in MODEL_COMPONENTS:
+        original = registry.get(name)
+        loaded = bundle.load_module(name)
+        assert type(loaded) is type(original)
+        expected = original.state_dict()
+        restored = loaded.state_dict()
+        assert restored.keys() == expected.keys()
+        for key, tensor in expected.items():
+            assert torch.equal(restored[key], tensor), f"{name}.{key}"
+
+def test_scheduler_and_tokenizer_round_trip(registry, tmp_path):
+    bundle = ModelBundle(export(registry, tmp_path / "bundle.safetensors"))
+    scheduler = bundle.load_scheduler()
+    assert type(scheduler) is type(registry.get('inference_scheduler'))
+    assert scheduler.config.num_train_timesteps == registry.get('noise_scheduler').config.num_train_timesteps
+    tokenizer = bundle.load_tokenizer()
+    assert tokenizer("water, river").input_ids == registry.get('tokenizer')("water, river").input_ids
+
+def test_tensors_are_views_of_the_mapped_file(registry, tmp_path):
+    bundle = ModelBundle(export(registry, tmp_path / "bundle.safetensors"))
+    state = bundle.state_dict('unet')
+    tensor = next(iter(state.values()))
+    mapped = torch.frombuffer(bundle._mmap, dtype=torch.uint8)
+    start = mapped.data_ptr()
+    assert start <= tensor.data_ptr() < start + mapped.numel()
+
+def test_export_dtype_and_load_dtype(registry, tmp_path):
+    bundle = ModelBundle(export(registry, tmp_path / "bundle16.safetensors", torch_dtype=torch.float16))
+    assert bundle.load_module('vae').dtype == torch.float16
+    assert bundle.load_module('vae', torch_dtype=torch.float32).dtype == torch.float32
+
+def test_loaded_pipeline_generates(registry, tmp_path):
+    from PIL import Image
+
+    pipe = ModelBundle(export(registry, tmp_path / "bundle.safetensors")).load_pipeline(torch.device('cpu'))
+    pipe.set_progress_bar_config(disable=True)
+    image = pipe("one", image=Image.new('RGB', (IMAGE_SIZE, IMAGE_SIZE), 'white'), num_inference_steps=2,
+                 height=IMAGE_SIZE, width=IMAGE_SIZE, generator=torch.Generator().manual_seed(0)).images[0]
+    assert image.size == (IMAGE_SIZE, IMAGE_SIZE)
+
+def test_plain_safetensors_file_is_rejected(tmp_path):
+    header = json.dumps({'__metadata__': {'format': 'pt'}}).encode('utf-8')
+    path = tmp_path / "plain.safetensors"
+    path.write_bytes(struct.pack('<Q', len(header)) + header)
+    with pytest.raises(ValueError):
+        ModelBundle(str(path))
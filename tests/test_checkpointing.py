@@ -0,0 +1,67 @@
+import os
+import json
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("safetensors")
+
+from src.model.checkpointing import (
+    CheckpointWriter,
+    find_checkpoints,
+    latest_checkpoint,
+    load_checkpoint,
+    rng_state,
+    set_rng_state,
+    to_cpu,
+)
+
+def write_checkpoint(writer: CheckpointWriter, step: int):
+    unet_state = {'conv.weight': torch.full((2, 2), float(step))}
+    writer.save(step, to_cpu(unet_state), json.dumps({'_class_name': 'UNet2DConditionModel'}), {'step': step})
+    writer.wait()
+
+def test_retention_keeps_the_last_checkpoints(tmp_path):
+    writer = CheckpointWriter(str(tmp_path), keep_last=2)
+    for step in (100, 200, 300, 400):
+        write_checkpoint(writer, step)
+    assert [step for step, _ in find_checkpoints(str(tmp_path))] == [300, 400]
+    assert latest_checkpoint(str(tmp_path)) == os.path.join(str(tmp_path), "step_400")
+
+def test_keep_last_zero_keeps_everything(tmp_path):
+    writer = CheckpointWriter(str(tmp_path), keep_last=0)
+    for step in (1, 2, 3):
+        write_checkpoint(writer, step)
+    assert len(find_checkpoints(str(tmp_path))) == 3
+
+def test_incomplete_checkpoints_are_ignored(tmp_path):
+    writer = CheckpointWriter(str(tmp_path), keep_last=3)
+    write_checkpoint(writer, 10)
+    # Una escritura interrumpida (sin renombrar) o sin estado de entrenamiento no cuenta
+    os.makedirs(tmp_path / "step_20.tmp")
+    os.makedirs(tmp_path / "step_30")
+    assert latest_checkpoint(str(tmp_path)) == os.path.join(str(tmp_path), "step_10")
+
+def test_resume_round_trip(tmp_path):
+    writer = CheckpointWriter(str(tmp_path))
+    write_checkpoint(writer, 5)
+    weights, state = load_checkpoint(latest_checkpoint(str(tmp_path)))
+    assert torch.equal(weights['conv.weight'], torch.full((2, 2), 5.0))
+    assert state == {'step': 5}
+
+def test_snapshot_does_not_follow_the_live_tensors():
+    live = {'weight': torch.zeros(3)}
+    snapshot = to_cpu(live)
+    live['weight'].add_(1)
+    assert snapshot['weight'].sum().item() == 0
+
+def test_rng_state_round_trip():
+    state = rng_state()
+    expected = torch.rand(3)
+    set_rng_state(state)
+    assert torch.equal(torch.rand(3), expected)
+
+def test_write_errors_surface_on_wait(tmp_path):
+    writer = CheckpointWriter(str(tmp_path))
+    writer.save(1, {'not_a_tensor': object()}, "{}", {})
+    with pytest.raises(RuntimeError):
+        writer.wait()
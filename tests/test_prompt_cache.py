@@ -0,0 +1,67 @@
+import types
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from src.model.prompt_cache import PromptEmbeddingCache
+
+class FakePipe:
+    device = torch.device('cpu')
+
+    def __init__(self, name: str = "clip"):
+        self.text_encoder = types.SimpleNamespace(
+            config=types.SimpleNamespace(_name_or_path=name), dtype=torch.float32, device=self.device
+        )
+        self.calls = []
+
+    def encode_prompt(self, prompts, device, num_images_per_prompt, do_classifier_free_guidance):
+        self.calls.append(list(prompts))
+        # Embedding reconocible por prompt: su longitud repetida (B x 3 x 2)
+        embeddings = torch.tensor([[float(len(prompt))] * 2 for prompt in prompts]).unsqueeze(1).repeat(1, 3, 1)
+        return embeddings, None
+
+def test_misses_are_encoded_in_one_batch_and_hits_are_reused():
+    pipe = FakePipe()
+    cache = PromptEmbeddingCache(pipe, max_entries=8)
+    first = cache.encode(["a", "bb", "a"])
+    assert pipe.calls == [["a", "bb"]]
+    assert first.shape == (3, 3, 2)
+    assert torch.equal(first[0], first[2])
+
+    cache.encode(["bb", "ccc"])
+    assert pipe.calls[-1] == ["ccc"]
+    # "a" repetido dentro del lote y "bb" en la segunda llamada cuentan como aciertos
+    assert cache.stats() == {'hits': 2, 'misses': 3, 'hit_rate': 0.4, 'entries': 3}
+
+def test_least_recently_used_entry_is_evicted():
+    pipe = FakePipe()
+    cache = PromptEmbeddingCache(pipe, max_entries=2)
+    cache.encode(["a"])
+    cache.encode(["bb"])
+    cache.encode(["a"])          # "a" pasa a ser el más reciente
+    cache.encode(["ccc"])        # desaloja "bb"
+    assert cache.stats()['entries'] == 2
+    cache.encode(["a"])
+    assert pipe.calls[-1] == ["ccc"]
+    cache.encode(["bb"])
+    assert pipe.calls[-1] == ["bb"]
+
+def test_entries_do_not_keep_the_whole_batch_alive():
+    cache = PromptEmbeddingCache(FakePipe(), max_entries=8)
+    cache.encode(["a", "bb", "ccc", "dddd"])
+    for entry in cache.entries.values():
+        assert entry.untyped_storage().nbytes() == entry.numel() * entry.element_size()
+
+def test_text_encoder_identity_is_part_of_the_key():
+    pipe = FakePipe()
+    cache = PromptEmbeddingCache(pipe, max_entries=8)
+    cache.encode(["a"])
+    pipe.text_encoder.config._name_or_path = "other-clip"
+    cache.encode(["a"])
+    assert len(pipe.calls) == 2
+
+def test_pipe_kwargs_default_to_the_empty_negative_prompt():
+    pipe = FakePipe()
+    kwargs = PromptEmbeddingCache(pipe).pipe_kwargs(["a", "bb"])
+    assert kwargs['prompt_embeds'].shape == kwargs['negative_prompt_embeds'].shape == (2, 3, 2)
+    assert pipe.calls[-1] == [""]
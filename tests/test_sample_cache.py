@@ -0,0 +1,33 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from src.model.sample_cache import SharedSampleCache
+
+def test_get_put_and_direct_mapped_eviction():
+    cache = SharedSampleCache(num_samples=10, height=4, width=4, budget_bytes=2 * 16)
+    assert cache.num_slots == 2
+    assert cache.get(3) is None
+
+    cache.put(3, torch.full((4, 4), 3, dtype=torch.uint8))
+    assert torch.equal(cache.get(3), torch.full((4, 4), 3, dtype=torch.uint8))
+
+    # 5 comparte ranura con 3 y la desaloja
+    cache.put(5, torch.full((4, 4), 5, dtype=torch.uint8))
+    assert cache.get(3) is None
+    assert cache.get(5)[0, 0].item() == 5
+
+def test_returned_sample_is_a_copy():
+    cache = SharedSampleCache(num_samples=1, height=2, width=2, budget_bytes=4)
+    cache.put(0, torch.zeros((2, 2), dtype=torch.uint8))
+    cache.get(0).fill_(9)
+    assert cache.get(0).sum().item() == 0
+
+def test_stats_count_every_lookup():
+    cache = SharedSampleCache(num_samples=4, height=2, width=2, budget_bytes=16)
+    for idx in range(4):
+        assert cache.get(idx) is None
+        cache.put(idx, torch.zeros((2, 2), dtype=torch.uint8))
+    for idx in range(4):
+        assert cache.get(idx) is not None
+    assert cache.stats() == {'hits': 4, 'misses': 4, 'hit_rate': 0.5, 'slots': 4}
@@ -0,0 +1,131 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+
+torch = pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from src.model.server import GenerationRequest, MicroBatcher, QueueFullError, make_handler
+
+DEFAULTS = {'num_inference_steps': 2, 'guidance_scale': 7.5, 'size': 64}
+
+class FakePipe:
+    device = torch.device('cpu')
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, negative_prompt, num_inference_steps, height, **kwargs):
+        self.calls.append((list(prompt), num_inference_steps, height))
+        return type('Output', (), {'images': [Image.new('RGB', (height, height)) for _ in prompt]})()
+
+def make_batcher(pipe, **kwargs):
+    options = {'max_batch_size': 2, 'max_wait_ms': 200, 'max_queue': 8, **kwargs}
+    return MicroBatcher(pipe, Image.new('RGB', (64, 64)), **options)
+
+def test_batches_only_group_compatible_requests():
+    pipe = FakePipe()
+    batcher = make_batcher(pipe)
+    requests = [GenerationRequest(f"a{i}", num_inference_steps=2, size=64) for i in range(3)]
+    requests.append(GenerationRequest("b", num_inference_steps=4, size=64))
+    for request in requests:
+        batcher.submit(request)
+    for request in requests:
+        assert request.done.wait(5)
+    batcher.close()
+
+    assert sorted(prompt for call in pipe.calls for prompt in call[0]) == ["a0", "a1", "a2", "b"]
+    for prompts, steps, _ in pipe.calls:
+        assert len(prompts) <= 2
+        assert {prompt[0] for prompt in prompts} == ({'a'} if steps == 2 else {'b'})
+    assert all(request.error is None and request.image is not None for request in requests)
+
+def test_full_queue_rejects_new_requests():
+    pipe = FakePipe()
+    # Con una espera larga el lote no se cierra y las peticiones siguen en cola
+    batcher = make_batcher(pipe, max_batch_size=8, max_wait_ms=10_000, max_queue=2)
+    batcher.submit(GenerationRequest("a"))
+    batcher.submit(GenerationRequest("b"))
+    with pytest.raises(QueueFullError):
+        batcher.submit(GenerationRequest("c"))
+    assert batcher.stats()['rejected'] == 1
+    batcher.close()
+
+def test_cancelled_requests_are_not_generated():
+    pipe = FakePipe()
+    batcher = make_batcher(pipe, max_batch_size=8, max_wait_ms=300)
+    kept, cancelled = GenerationRequest("kept"), GenerationRequest("cancelled")
+    batcher.submit(kept)
+    batcher.submit(cancelled)
+    assert batcher.cancel(cancelled)
+    assert kept.done.wait(5)
+    batcher.close()
+
+    assert [call[0] for call in pipe.calls] == [["kept"]]
+    assert not cancelled.done.is_set()
+    assert batcher.stats()['cancelled'] == 1
+
+@pytest.mark.parametrize("kwargs", [
+    {'prompt': ["a", "b"]},
+    {'prompt': None},
+    {'prompt': "a", 'size': 30},
+    {'prompt': "a", 'size': 0},
+    {'prompt': "a", 'num_inference_steps': 0},
+    {'prompt': "a", 'negative_prompt': 3},
+])
+def test_invalid_requests_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        GenerationRequest(**kwargs)
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def start(pipe, timeout=5, **kwargs):
+        batcher = make_batcher(pipe, **kwargs)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(batcher, DEFAULTS, timeout))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, batcher))
+        return f"http://127.0.0.1:{server.server_address[1]}", batcher
+
+    yield start
+    for server, batcher in servers:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+def post(url: str, payload) -> tuple:
+    request = urllib.request.Request(f"{url}/generate", data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+@pytest.mark.parametrize("payload", [
+    {'prompt': "a", 'seed': "abc"},
+    {'prompt': "a", 'seed': {}},
+    {'prompt': 3},
+    {'prompt': "a", 'size': 100},
+    {'prompt': "a", 'num_inference_steps': -1},
+    {'seed': 1},
+    ["a"],
+])
+def test_http_rejects_invalid_payloads_and_keeps_serving(http_server, payload):
+    url, _ = http_server(FakePipe())
+    status, body = post(url, payload)
+    assert status == 400, body
+    status, body = post(url, {'prompt': "a", 'seed': "7"})
+    assert status == 200 and body['image']
+
+def test_http_timeout_cancels_the_queued_request(http_server):
+    pipe = FakePipe()
+    url, batcher = http_server(pipe, timeout=0.2, max_batch_size=8, max_wait_ms=10_000)
+    status, _ = post(url, {'prompt': "late"})
+    assert status == 504
+    assert batcher.stats()['cancelled'] == 1
+    assert batcher.stats()['queued'] == 0
@@ -0,0 +1,75 @@
+import os
+from configs.yaml_step_executor import YamlStepExecutor
+
+class WriteStep:
+    def __init__(self, input_file, output_file):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.runs = 0
+
+    def process(self):
+        self.runs += 1
+        with open(self.output_file, 'w') as f:
+            f.write(open(self.input_file).read().upper())
+
+def make_executor(tmp_path, **kwargs):
+    return YamlStepExecutor({'cache': {'manifest': str(tmp_path / "manifest.json")}, 'steps': []}, **kwargs)
+
+def step_config(params, **extra):
+    return {'module': 'tests.test_step_executor', 'class': 'WriteStep', 'name': 'write', 'params': params, **extra}
+
+def test_unchanged_step_is_skipped_and_changed_input_reruns(tmp_path):
+    source, target = tmp_path / "in.txt", tmp_path / "out.txt"
+    source.write_text("kanji")
+    config = step_config({'input_file': str(source), 'output_file': str(target)})
+    step = WriteStep(str(source), str(target))
+
+    make_executor(tmp_path).run_step(1, step, config)
+    make_executor(tmp_path).run_step(1, step, config)
+    assert step.runs == 1
+
+    source.write_text("kanji, more")
+    os.utime(source, ns=(0, 0))
+    make_executor(tmp_path).run_step(1, step, config)
+    assert step.runs == 2
+    assert target.read_text() == "KANJI, MORE"
+
+def test_deleted_output_and_force_rerun(tmp_path):
+    source, target = tmp_path / "in.txt", tmp_path / "out.txt"
+    source.write_text("kanji")
+    config = step_config({'input_file': str(source), 'output_file': str(target)})
+    step = WriteStep(str(source), str(target))
+
+    make_executor(tmp_path).run_step(1, step, config)
+    target.unlink()
+    make_executor(tmp_path).run_step(1, step, config)
+    assert step.runs == 2
+    make_executor(tmp_path, force=True).run_step(1, step, config)
+    assert step.runs == 3
+
+def test_flags_are_not_paths_and_unwritten_outputs_are_ignored(tmp_path):
+    config = step_config({
+        'input_files': ['a.xml.gz'],
+        'output_files': ['a.xml'],
+        'write_output': False,
+        'output_format': 'png'
+    })
+    assert YamlStepExecutor.classify_params(config) == (['input_files'], [])
+    config['params']['write_output'] = True
+    assert YamlStepExecutor.classify_params(config) == (['input_files'], ['output_files'])
+
+def test_step_without_written_outputs_is_skipped(tmp_path):
+    source = tmp_path / "in.txt"
+    source.write_text("kanji")
+    config = step_config({'input_file': str(source), 'output_file': str(tmp_path / "never.txt"), 'write_output': False})
+
+    class NoWriteStep:
+        runs = 0
+
+        def process(self):
+            self.runs += 1
+
+    step = NoWriteStep()
+    make_executor(tmp_path).run_step(1, step, config)
+    make_executor(tmp_path).run_step(1, step, config)
+    assert step.runs == 1